@@ -0,0 +1,40 @@
+"""Add activity_log table
+
+Revision ID: 358fd6951d6a
+Revises: 075241a1cc7f
+Create Date: 2026-10-19 22:14:03.530871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '358fd6951d6a'
+down_revision: Union[str, Sequence[str], None] = '075241a1cc7f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('activity_log',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(), nullable=False),
+    sa.Column('changes', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Serves GET /projects/{id}/activity, newest first
+    op.create_index('ix_activity_log_project_id_created_at', 'activity_log', ['project_id', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_activity_log_project_id_created_at', table_name='activity_log')
+    op.drop_table('activity_log')
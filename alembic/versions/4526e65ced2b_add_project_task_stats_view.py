@@ -0,0 +1,55 @@
+"""Add project_task_stats materialized view
+
+Revision ID: 4526e65ced2b
+Revises: f4ef22531f87
+Create Date: 2026-10-19 17:52:40.118364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4526e65ced2b'
+down_revision: Union[str, Sequence[str], None] = 'f4ef22531f87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Counters as of the last refresh (python -m app.jobs refresh-stats);
+    # overdue is relative to refreshed_at
+    op.execute("""
+        CREATE MATERIALIZED VIEW project_task_stats AS
+        SELECT project_id,
+               count(*) AS total_tasks,
+               count(*) FILTER (WHERE status = 'todo') AS todo,
+               count(*) FILTER (WHERE status = 'in_progress') AS in_progress,
+               count(*) FILTER (WHERE status = 'done') AS done,
+               count(*) FILTER (WHERE priority = 'high') AS high_priority,
+               count(*) FILTER (WHERE priority = 'medium') AS medium_priority,
+               count(*) FILTER (WHERE priority = 'low') AS low_priority,
+               count(*) FILTER (WHERE assigned_to IS NULL) AS unassigned,
+               count(*) FILTER (WHERE status <> 'done' AND due_date < now()) AS overdue,
+               now() AS refreshed_at
+        FROM (
+            SELECT project_id, status, priority, assigned_to, due_date FROM tasks
+            UNION ALL
+            SELECT project_id, status, priority, assigned_to, due_date FROM tasks_archive
+        ) AS all_tasks
+        GROUP BY project_id
+    """)
+    # Required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.create_index('ix_project_task_stats_project_id', 'project_task_stats', ['project_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP MATERIALIZED VIEW project_task_stats')
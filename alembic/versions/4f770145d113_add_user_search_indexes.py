@@ -0,0 +1,45 @@
+"""Add user search indexes
+
+Indexes for GET /users/search (PostgreSQL only; see crud.search_users):
+  - btree on lower(username) and lower(email) in the "C" collation. Unlike
+    text_pattern_ops, these also return prefix matches already in order, so
+    a short prefix reads `limit` index entries instead of sorting every match.
+  - GIN pg_trgm indexes on the same expressions for fuzzy (%) matching.
+
+Revision ID: 4f770145d113
+Revises: 358fd6951d6a
+Create Date: 2026-10-19 23:02:19.846105
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f770145d113'
+down_revision: Union[str, Sequence[str], None] = '358fd6951d6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = ('username', 'email')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in COLUMNS:
+        op.execute(f'CREATE INDEX ix_users_{column}_prefix ON users ((lower({column}) COLLATE "C"))')
+        op.execute(f'CREATE INDEX ix_users_{column}_trgm ON users USING gin (lower({column}) gin_trgm_ops)')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for column in COLUMNS:
+        op.execute(f'DROP INDEX IF EXISTS ix_users_{column}_trgm')
+        op.execute(f'DROP INDEX IF EXISTS ix_users_{column}_prefix')
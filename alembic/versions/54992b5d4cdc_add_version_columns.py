@@ -0,0 +1,33 @@
+"""Add version columns
+
+Revision ID: 54992b5d4cdc
+Revises: 4526e65ced2b
+Create Date: 2026-10-19 18:34:12.602915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '54992b5d4cdc'
+down_revision: Union[str, Sequence[str], None] = '4526e65ced2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant server default: existing rows get version 1 without a table rewrite
+    op.add_column('projects', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('tasks', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('tasks_archive', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tasks_archive', 'version')
+    op.drop_column('tasks', 'version')
+    op.drop_column('projects', 'version')
@@ -0,0 +1,42 @@
+"""Add rate limit buckets table
+
+Backs RATE_LIMIT_BACKEND=postgres. UNLOGGED: buckets are disposable, so they
+skip the WAL and are simply emptied after a crash.
+
+Revision ID: 6924efc002ae
+Revises: 89faa1d6149e
+Create Date: 2026-10-19 15:08:52.730190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6924efc002ae'
+down_revision: Union[str, Sequence[str], None] = '89faa1d6149e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('''
+        CREATE UNLOGGED TABLE rate_limit_buckets (
+            key varchar PRIMARY KEY,
+            tokens double precision NOT NULL,
+            allowed boolean NOT NULL,
+            updated_at timestamp with time zone NOT NULL
+        )
+    ''')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_table('rate_limit_buckets')
@@ -0,0 +1,34 @@
+"""Project soft delete and task cascade
+
+Revision ID: 70f3ea7399f8
+Revises: 93d0ff4076c7
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '70f3ea7399f8'
+down_revision: Union[str, Sequence[str], None] = '93d0ff4076c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('projects', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.drop_constraint('tasks_project_id_fkey', 'tasks', type_='foreignkey')
+    op.create_foreign_key('tasks_project_id_fkey', 'tasks', 'projects', ['project_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_tasks_project_id'), 'tasks', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tasks_project_id'), table_name='tasks')
+    op.drop_constraint('tasks_project_id_fkey', 'tasks', type_='foreignkey')
+    op.create_foreign_key('tasks_project_id_fkey', 'tasks', 'projects', ['project_id'], ['id'])
+    op.drop_column('projects', 'deleted_at')
@@ -0,0 +1,33 @@
+"""Add open tasks change_seq index
+
+The reminder scan's catch-up (tasks created or rescheduled behind the due
+mark) selects open tasks by change_seq range; without this index it read every
+open task overdue in the retention window on each run.
+
+Revision ID: b7d2c41e9a58
+Revises: 4f770145d113
+Create Date: 2026-10-20 10:12:44.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2c41e9a58'
+down_revision: Union[str, Sequence[str], None] = '4f770145d113'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_change_seq_open', 'tasks', ['change_seq'], unique=False,
+                    postgresql_where=sa.text("status <> 'done'"), sqlite_where=sa.text("status <> 'done'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_change_seq_open', table_name='tasks')
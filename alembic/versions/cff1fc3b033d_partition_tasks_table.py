@@ -0,0 +1,122 @@
+"""Partition tasks table
+
+Converts `tasks` into a table hash-partitioned by project_id into
+TASKS_HASH_PARTITIONS partitions (default 16), PostgreSQL only. Every
+per-project list and stats query prunes to one partition.
+
+The primary key has to include the partition key, so it becomes
+(id, project_id) and no longer keeps id unique on its own. The task_ids
+table takes that over: triggers claim each task's id there on insert and
+release it on delete, and its primary key rejects a duplicate.
+
+Existing rows are copied in one statement, so run this during a
+maintenance window.
+
+Revision ID: cff1fc3b033d
+Revises: e9e3c55b41d2
+Create Date: 2026-10-19 11:20:45.118734
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'cff1fc3b033d'
+down_revision: Union[str, Sequence[str], None] = 'e9e3c55b41d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TASK_COLUMNS = """
+    id integer NOT NULL DEFAULT nextval('tasks_id_seq'),
+    title varchar NOT NULL,
+    description text,
+    status varchar,
+    priority varchar,
+    project_id integer NOT NULL,
+    assigned_to integer,
+    created_by integer NOT NULL,
+    due_date timestamp with time zone,
+    created_at timestamp with time zone NOT NULL DEFAULT now(),
+    updated_at timestamp with time zone
+"""
+
+COPY_COLUMNS = 'id, title, description, status, priority, project_id, assigned_to, created_by, due_date, created_at, updated_at'
+
+
+def replace_tasks_table(create_sql: str) -> None:
+    """Swap `tasks` for a new table built by `create_sql`, keeping its rows and id sequence"""
+    op.execute('ALTER SEQUENCE tasks_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE tasks RENAME TO tasks_old')
+    op.execute(create_sql)
+
+
+def finish_tasks_table(primary_key: str) -> None:
+    """Copy rows from tasks_old, drop it and restore constraints and indexes"""
+    op.execute(f'INSERT INTO tasks ({COPY_COLUMNS}) SELECT {COPY_COLUMNS.replace("created_at", "coalesce(created_at, now())")} FROM tasks_old')
+    op.execute('DROP TABLE tasks_old')
+    op.execute(f'ALTER TABLE tasks ADD CONSTRAINT tasks_pkey PRIMARY KEY ({primary_key})')
+    op.create_foreign_key('tasks_project_id_fkey', 'tasks', 'projects', ['project_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('tasks_assigned_to_fkey', 'tasks', 'users', ['assigned_to'], ['id'])
+    op.create_foreign_key('tasks_created_by_fkey', 'tasks', 'users', ['created_by'], ['id'])
+    op.create_index(op.f('ix_tasks_id'), 'tasks', ['id'], unique=False)
+    op.create_index(op.f('ix_tasks_project_id'), 'tasks', ['project_id'], unique=False)
+    op.execute('ALTER SEQUENCE tasks_id_seq OWNED BY tasks.id')
+
+
+# One row per live task id; a duplicate id fails on its primary key
+TASK_ID_GUARD = """
+CREATE TABLE task_ids (id integer PRIMARY KEY);
+INSERT INTO task_ids (id) SELECT id FROM tasks;
+
+CREATE FUNCTION tasks_guard_id() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM task_ids WHERE id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO task_ids (id) VALUES (NEW.id);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER tasks_guard_id AFTER INSERT OR DELETE ON tasks
+    FOR EACH ROW EXECUTE FUNCTION tasks_guard_id();
+CREATE TRIGGER tasks_guard_id_update AFTER UPDATE OF id ON tasks
+    FOR EACH ROW WHEN (OLD.id <> NEW.id) EXECUTE FUNCTION tasks_guard_id();
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    partitions = int(os.getenv('TASKS_HASH_PARTITIONS', '16'))
+    replace_tasks_table(f'CREATE TABLE tasks ({TASK_COLUMNS}) PARTITION BY HASH (project_id)')
+    for remainder in range(partitions):
+        op.execute(
+            f'CREATE TABLE tasks_p{remainder} PARTITION OF tasks '
+            f'FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})'
+        )
+    finish_tasks_table('id, project_id')
+    op.execute(TASK_ID_GUARD)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('DROP TRIGGER tasks_guard_id_update ON tasks')
+    op.execute('DROP TRIGGER tasks_guard_id ON tasks')
+    op.execute('DROP FUNCTION tasks_guard_id()')
+    op.execute('DROP TABLE task_ids')
+    # Dropping the partitioned parent drops all of its partitions
+    replace_tasks_table(f'CREATE TABLE tasks ({TASK_COLUMNS})')
+    finish_tasks_table('id')
+    op.alter_column('tasks', 'created_at', nullable=True)
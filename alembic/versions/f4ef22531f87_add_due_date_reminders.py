@@ -0,0 +1,44 @@
+"""Add due date reminders
+
+Revision ID: f4ef22531f87
+Revises: 6924efc002ae
+Create Date: 2026-10-19 16:27:03.481566
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4ef22531f87'
+down_revision: Union[str, Sequence[str], None] = '6924efc002ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tasks_due_date_open', 'tasks', ['due_date'], unique=False,
+                    postgresql_where=sa.text("status <> 'done'"))
+    op.create_table('reminder_marks',
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('due_mark', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('seq_mark', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('kind', 'shard')
+    )
+    op.create_table('task_reminders',
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('due_date', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('task_id', 'kind', 'due_date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('task_reminders')
+    op.drop_table('reminder_marks')
+    op.drop_index('ix_tasks_due_date_open', table_name='tasks')
@@ -0,0 +1,83 @@
+"""Project access per user.
+
+A user can reach a project they own or one shared with them through
+project_members. Their access is a small {project_id: role} dict, loaded
+with one query and kept in a per-worker LRU cache, so authorization in a
+request is a dict lookup and list endpoints filter with project_id = ANY(:ids).
+
+Changes are announced with events.emit_access_changed() in the transaction
+that makes them; after commit every worker drops the users' cached entries.
+A load that overlaps an invalidation is not cached. The whole cache is
+dropped whenever the LISTEN connection is (re)opened, since notifications
+may have been missed while it was down, and entries expire after `max_age`
+seconds as a last resort.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from app import auth, crud, events
+from app.database import get_db
+
+OWNER = 'owner'
+ROLE_RANK = {'viewer': 1, 'editor': 2, OWNER: 3}
+
+class AccessCache:
+    def __init__(self, max_users: int = 10_000, max_age: float = 300):
+        self.max_users = max_users
+        self.max_age = max_age
+        self._entries = OrderedDict()  # user_id -> (loaded at, {project_id: role})
+        self._generation = 0  # bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, load) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self.max_age:
+                self._entries.move_to_end(user_id)
+                return entry[1]
+            generation = self._generation
+        projects = load()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[user_id] = (now, projects)
+                self._entries.move_to_end(user_id)
+                if len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return projects
+
+    def forget(self, user_ids: Optional[list]):
+        """Drop the entries of `user_ids`; None drops them all"""
+        with self._lock:
+            self._generation += 1
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+cache = AccessCache()
+events.broker.add_handler('access.changed', lambda event: cache.forget(event['user_ids']))
+# Notifications may have been missed while the listener was not listening
+events.broker.add_handler(events.LISTENING, lambda event: cache.forget(None))
+
+def get_access(db: Session, user_id: int) -> dict:
+    """{project_id: role} of the live projects `user_id` can reach; do not modify"""
+    return cache.get(user_id, lambda: crud.get_accessible_projects(db, user_id))
+
+def can(access: dict, project_id: int, role: str = 'viewer') -> bool:
+    return ROLE_RANK.get(access.get(project_id), 0) >= ROLE_RANK[role]
+
+def project_ids(access: dict, role: str = 'viewer') -> list:
+    return [project_id for project_id in access if can(access, project_id, role)]
+
+def get_current_access(
+    current_user = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+) -> dict:
+    return get_access(db, current_user.id)
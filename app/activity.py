@@ -0,0 +1,137 @@
+"""Activity log: who changed what on projects and tasks.
+
+Routes call record() after their change has committed. It only appends to a
+bounded in-memory queue, so a write request pays nothing for the log. A
+background thread takes rows off the queue and writes them with one
+multi-row INSERT per shard once `batch_size` rows are waiting or `flush_interval`
+has passed since the first of them.
+
+When the queue is full, new entries are dropped and counted rather than
+slowing requests down. Entries still queued when the app shuts down are
+written by stop(). A crash loses at most the queue, so the log is an audit
+aid, not a source of truth.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from app import models
+from app.database import SessionLocal, pin_shard, shard_for_id
+
+logger = logging.getLogger(__name__)
+
+class ActivityWriter:
+    def __init__(self, queue_size: int = 10_000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='activity-writer', daemon=True)
+        # Metrics
+        self.recorded = 0
+        self.dropped = 0  # queue full
+        self.written = 0
+        self.failed = 0  # lost with a failed batch
+        self.batches = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def record(self, entry: dict):
+        try:
+            self._queue.put_nowait(entry)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Write what is queued and stop"""
+        self._stopped.set()
+        self._thread.join()
+
+    def metrics(self) -> dict:
+        return {
+            'backlog': self._queue.qsize(),
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+            # Size or time, whichever comes first
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stopped.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+                except queue.Empty:
+                    pass
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch: list):
+        by_shard = {}
+        for entry in batch:
+            by_shard.setdefault(shard_for_id(entry['project_id']), []).append(entry)
+        for shard, rows in by_shard.items():
+            db = pin_shard(SessionLocal(), shard)
+            try:
+                # executemany: batched into multi-row VALUES by the dialect
+                db.execute(insert(models.ActivityLog), rows)
+                db.commit()
+                self.written += len(rows)
+                self.batches += 1
+            except Exception:
+                db.rollback()
+                self.failed += len(rows)
+                logger.exception('Writing %d activity rows failed', len(rows))
+            finally:
+                db.close()
+
+_writer = None
+
+def start(queue_size: int, batch_size: int, flush_interval: float) -> ActivityWriter:
+    global _writer
+    _writer = ActivityWriter(queue_size, batch_size, flush_interval).start()
+    return _writer
+
+def stop():
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+def metrics():
+    return _writer.metrics() if _writer is not None else None
+
+def record(user_id: int, action: str, project_id: int, task_id: int = None, changes: dict = None):
+    """Queue an activity entry; a no-op when the writer is not running"""
+    if _writer is not None:
+        _writer.record({
+            'project_id': project_id,
+            'task_id': task_id,
+            'user_id': user_id,
+            'action': action,
+            'changes': changes,
+            'created_at': datetime.now(timezone.utc),
+        })
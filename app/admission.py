@@ -0,0 +1,182 @@
+"""Admission control middleware.
+
+Requests are sorted into route classes (read, write, auth, stats, export,
+bulk), each with a cap on requests in flight. A request over the cap waits in line
+for at most the queue budget; if no slot frees up by then it is turned away
+with 503 and Retry-After, so when the database slows down, callers get a
+fast answer instead of piling up in the threadpool behind get_db.
+
+Each admitted request may hold a pool connection, so the caps are carved out
+of the connection pool (DB_POOL_SIZE + DB_MAX_OVERFLOW, less
+RESERVED_CONNECTIONS for the background threads) by the weights in
+ROUTE_SHARES. Together they never exceed the pool, and an admitted request
+does not wait in get_db for a connection; the pool timeout is the queue
+budget, as a backstop.
+
+Admitted requests get a deadline (scope['state']['deadline'], a
+time.monotonic() value) from their class. Sessions opened for the request
+apply the time left as `SET LOCAL statement_timeout` on PostgreSQL (see
+database.apply_deadline), so a runaway query is cancelled instead of holding
+its connection.
+
+Configuration (environment, read into Settings):
+  ADMISSION_ENABLED    true/false (default true)
+  ADMISSION_LIMITS     JSON overrides per class, e.g. {"stats": "4/15000"}:
+                       max in flight / deadline in ms. The other classes
+                       share the rest of the pool; caps beyond it are an error
+  ADMISSION_QUEUE_MS   longest wait for a slot before 503 (default 250)
+"""
+import asyncio
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+from starlette.responses import JSONResponse
+
+from app.config import Settings
+
+class RouteClass(NamedTuple):
+    max_in_flight: int
+    deadline: float  # seconds
+
+    @classmethod
+    def parse(cls, value: str):
+        """'4/15000' -> 4 in flight, 15 second deadline"""
+        max_in_flight, deadline_ms = value.split('/')
+        return cls(int(max_in_flight), int(deadline_ms) / 1000)
+
+class RouteShare(NamedTuple):
+    weight: int  # share of the pool
+    deadline: float  # seconds
+
+ROUTE_SHARES = {
+    'read': RouteShare(5, 5),
+    'write': RouteShare(2, 5),
+    'auth': RouteShare(1, 5),  # bcrypt is CPU bound
+    'stats': RouteShare(1, 15),
+    'export': RouteShare(1, 120),
+    'bulk': RouteShare(1, 600),  # user provisioning, which runs a hashing process per core
+}
+
+# Held outside requests: the LISTEN connection, the activity writer, the write
+# coalescer and the reminder scheduler
+RESERVED_CONNECTIONS = 4
+
+def route_classes(connections: int, overrides: Optional[dict] = None) -> dict:
+    """Caps and deadlines for a pool of `connections`. Classes in `overrides`
+    keep theirs; the others split what is left by weight, at least one slot
+    each. ValueError when the caps do not fit in the pool."""
+    classes = dict(overrides or {})
+    shares = {name: share for name, share in ROUTE_SHARES.items() if name not in classes}
+    available = connections - RESERVED_CONNECTIONS - sum(limit.max_in_flight for limit in classes.values())
+    total = sum(share.weight for share in shares.values()) or 1
+    caps = {name: max(1, available * share.weight // total) for name, share in shares.items()}
+    # Rounding the small classes up to one can overshoot; take it back from the largest
+    while sum(caps.values()) > available and max(caps.values(), default=1) > 1:
+        caps[max(caps, key=caps.get)] -= 1
+    if sum(caps.values()) > available:
+        raise ValueError(
+            f'Admission caps need more than the {connections} pool connections; '
+            'raise DB_POOL_SIZE / DB_MAX_OVERFLOW or lower ADMISSION_LIMITS'
+        )
+    classes.update({name: RouteClass(caps[name], share.deadline) for name, share in shares.items()})
+    return classes
+
+# For the default pool
+ROUTE_CLASSES = route_classes(Settings.db_pool_size + Settings.db_max_overflow)
+
+# Never queued: health checks must answer under load, the profiler is how
+# load gets diagnosed, and event streams stay open indefinitely
+UNLIMITED = {'/health', '/health/ready', '/admin/profile'}
+
+def route_class(method: str, path: str) -> Optional[str]:
+    path = path.rstrip('/') or '/'
+    if path in UNLIMITED or path.endswith('/events'):
+        return None
+    if path.endswith('/export'):
+        return 'export'
+    if path.endswith('/stats'):
+        return 'stats'
+    if path == '/users/bulk':
+        return 'bulk'
+    if path in ('/auth/login', '/users') and method == 'POST':
+        return 'auth'
+    if method in ('GET', 'HEAD'):
+        return 'read'
+    return 'write'
+
+class Gate:
+    """Counting semaphore whose waiters give up after a timeout; slots are
+    handed to waiters in arrival order"""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._waiters = deque()
+
+    async def enter(self, timeout: float) -> bool:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A slot handed over by leave() keeps in_flight as it is
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Pass on the slot that was just handed to us
+                self.leave()
+            raise
+        finally:
+            if waiter.cancelled():
+                self._waiters.remove(waiter)
+
+    def leave(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+class AdmissionMiddleware:
+    def __init__(self, app, classes: Optional[dict] = None, queue_timeout: float = 0.25, enabled: bool = True):
+        self.app = app
+        self.classes = classes if classes is not None else dict(ROUTE_CLASSES)
+        self.gates = {name: Gate(limit.max_in_flight) for name, limit in self.classes.items()}
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        # Metrics
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.enabled:
+            return await self.app(scope, receive, send)
+        name = route_class(scope['method'], scope['path'])
+        gate = self.gates.get(name)
+        if gate is None:
+            return await self.app(scope, receive, send)
+
+        if not await gate.enter(self.queue_timeout):
+            self.rejected += 1
+            response = JSONResponse({'detail': 'Server busy'}, status_code=503, headers={'Retry-After': '1'})
+            return await response(scope, receive, send)
+        try:
+            scope.setdefault('state', {})['deadline'] = time.monotonic() + self.classes[name].deadline
+            await self.app(scope, receive, send)
+        finally:
+            gate.leave()
+
+def from_settings(settings: Settings):
+    """Middleware options from the settings"""
+    if not settings.admission_enabled:
+        return {'enabled': False}
+    overrides = {name: RouteClass.parse(value) for name, value in settings.admission_limits}
+    return {
+        'classes': route_classes(settings.db_pool_size + settings.db_max_overflow, overrides),
+        'queue_timeout': settings.admission_queue_ms / 1000,
+        'enabled': settings.admission_enabled,
+    }
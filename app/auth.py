@@ -7,13 +7,10 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app import crud
-import os
-from dotenv import load_dotenv
+from app.config import JWT_ALGORITHM, get_settings
+from app.exceptions import ForbiddenException
 
-load_dotenv()
-
-SECRET_KEY = os.getenv('SECRET_KEY', 'your-fallback-secret-key')
-ALGORITHM = 'HS256'
+ALGORITHM = JWT_ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='auth/login')
@@ -34,12 +31,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({'exp': expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, get_settings().secret_key, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str, credentials_exception):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, get_settings().secret_key, algorithms=[ALGORITHM])
         email: str = payload.get('sub')
         if email is None:
             raise credentials_exception
@@ -58,3 +55,8 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if user is None:
         raise credentials_exception
     return user
+
+def get_current_admin(current_user = Depends(get_current_user)):
+    if current_user.email.lower() not in get_settings().admin_emails:
+        raise ForbiddenException('Admin access required')
+    return current_user
@@ -0,0 +1,128 @@
+"""Write coalescing for bursts of task updates.
+
+Kanban drag-and-drop sends many PUT /tasks/{id} calls in quick succession.
+With WRITE_COALESCE_MS set, updates without If-Match are queued here. After
+the first write of a burst, the coalescer waits `window` seconds and merges
+every update to the same task into one UPDATE (later values win). It then
+applies the whole batch in a single transaction, one commit for the group.
+If that transaction fails, the writes are retried one per transaction, so only
+the failing write's requests get the error. Each request waits for its commit
+before it is answered, so an acknowledged write is durable; it receives the
+task as it stands after the merged update.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from app import access, crud
+from app.database import SessionLocal, pin_shard, shard_for_id
+
+logger = logging.getLogger(__name__)
+
+class PendingWrite:
+    def __init__(self):
+        self.values = {}
+        self.futures = []
+
+class WriteCoalescer:
+    def __init__(self, window: float = 0.02):
+        self.window = window
+        self._pending = {}  # (task_id, user_id) -> PendingWrite
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='write-coalescer', daemon=True)
+        # Metrics
+        self.writes = 0
+        self.updates = 0
+        self.commits = 0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, task_id: int, user_id: int, values: dict) -> Future:
+        """Queue an update; the future resolves to the updated task, or None
+        when the task does not exist or the user may not edit it"""
+        future = Future()
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError('Write coalescer is stopped')
+            pending = self._pending.setdefault((task_id, user_id), PendingWrite())
+            pending.values.update(values)
+            pending.futures.append(future)
+            self.writes += 1
+        self._wakeup.set()
+        return future
+
+    def stop(self):
+        """Flush what is queued and stop"""
+        with self._lock:
+            self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            if not self._stopped:
+                # Let the rest of the burst arrive
+                time.sleep(self.window)
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._wakeup.clear()
+                stopped = self._stopped
+            if batch:
+                self._flush(batch)
+            if stopped:
+                return
+
+    def _flush(self, batch: dict):
+        # One transaction per shard
+        by_shard = {}
+        for key, pending in batch.items():
+            by_shard.setdefault(shard_for_id(key[0]), {})[key] = pending
+        for shard, writes in by_shard.items():
+            self._flush_shard(shard, writes)
+
+    def _flush_shard(self, shard: int, batch: dict):
+        try:
+            results = self._apply(shard, batch)
+        except Exception:
+            logger.warning('Coalesced batch of %d writes failed, retrying them one by one', len(batch))
+            # Retry each write on its own, so a bad one only fails its own requests
+            for key, pending in batch.items():
+                try:
+                    result = self._apply(shard, {key: pending})[key]
+                except Exception as exc:
+                    logger.exception('Coalesced write failed')
+                    for future in pending.futures:
+                        future.set_exception(exc)
+                else:
+                    for future in pending.futures:
+                        future.set_result(result)
+            return
+        for key, pending in batch.items():
+            for future in pending.futures:
+                future.set_result(results[key])
+
+    def _apply(self, shard: int, batch: dict) -> dict:
+        """Apply `batch` in one transaction; returns the updated tasks by key"""
+        db = pin_shard(SessionLocal(), shard)
+        try:
+            results = {
+                (task_id, user_id): crud.apply_task_update(
+                    db, task_id, pending.values, access.project_ids(access.get_access(db, user_id), 'editor')
+                )
+                for (task_id, user_id), pending in batch.items()
+            }
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self.updates += len(batch)
+        self.commits += 1
+        return results
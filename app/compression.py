@@ -0,0 +1,193 @@
+"""Response compression and ETags.
+
+Negotiates zstd, br or gzip from Accept-Encoding. zstd and br are used only
+when the optional `zstandard` / `brotli` packages are installed.
+
+- Complete GET 200 responses get a weak ETag computed from the body, and
+  If-None-Match is answered with 304. Their compressed bytes are kept in an
+  LRU keyed on (digest of the body, encoding), so a repeated poll returning
+  the same content is not compressed again. The key is never an ETag set by
+  the app: version ETags repeat across resources.
+- Bodies smaller than minimum_size are sent as they are.
+- Streaming responses (e.g. exports) are compressed chunk by chunk with a
+  flush after each chunk. Event streams are never compressed.
+
+Configuration (environment, read into Settings): COMPRESSION_MIN_SIZE (bytes, default 1024),
+COMPRESSION_LEVEL (gzip/zstd level, default 6).
+"""
+import hashlib
+import zlib
+from collections import OrderedDict
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import Settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=min(level, 11))
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class ZstdEncoder:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+# In order of preference when the client accepts several equally
+ENCODERS = {'gzip': GzipEncoder}
+if brotli is not None:
+    ENCODERS = {'br': BrotliEncoder, **ENCODERS}
+if zstandard is not None:
+    ENCODERS = {'zstd': ZstdEncoder, **ENCODERS}
+
+def negotiate(accept_encoding: str):
+    """Best supported encoding for an Accept-Encoding header, or None"""
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                continue
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in ENCODERS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def body_digest(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: ignore W/ prefixes
+    return etag.removeprefix('W/') in {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = 1024, level: int = 6, cache_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def compress(self, encoding: str, body: bytes, digest: str = None) -> bytes:
+        """Compressed `body`; cached when `digest` (body_digest of it) is given"""
+        key = (digest, encoding)
+        if digest is not None and key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        encoder = ENCODERS[encoding](self.level)
+        compressed = encoder.compress(body) + encoder.finish()
+        if digest is not None:
+            self._cache[key] = compressed
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get('accept-encoding', ''))
+        is_get = scope['method'] in ('GET', 'HEAD')
+        state = {'start': None, 'mode': None, 'encoder': None}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                state['start'] = message
+                return
+            if message['type'] != 'http.response.body':
+                return await send(message)
+
+            start = state['start']
+            if state['mode'] is None:
+                headers = MutableHeaders(scope=start)
+                body = message.get('body', b'')
+                more_body = message.get('more_body', False)
+                if (start['status'] != 200 or 'content-encoding' in headers
+                        or headers.get('content-type', '').startswith('text/event-stream')):
+                    state['mode'] = 'passthrough'
+                elif more_body:
+                    state['mode'] = 'stream' if encoding else 'passthrough'
+                    if encoding:
+                        state['encoder'] = ENCODERS[encoding](self.level)
+                        del headers['content-length']
+                        headers['content-encoding'] = encoding
+                        headers.add_vary_header('Accept-Encoding')
+                else:
+                    state['mode'] = 'done'
+                    digest = None
+                    if is_get:
+                        digest = body_digest(body)
+                        etag = headers.get('etag') or f'W/"{digest}"'
+                        headers['etag'] = etag
+                        if etag_matches(request_headers.get('if-none-match', ''), etag):
+                            not_modified = {'type': 'http.response.start', 'status': 304, 'headers': start['headers']}
+                            not_modified_headers = MutableHeaders(scope=not_modified)
+                            del not_modified_headers['content-length']
+                            del not_modified_headers['content-type']
+                            await send(not_modified)
+                            return await send({'type': 'http.response.body', 'body': b''})
+                    if encoding and len(body) >= self.minimum_size:
+                        body = self.compress(encoding, body, digest)
+                        headers['content-encoding'] = encoding
+                        headers['content-length'] = str(len(body))
+                        headers.add_vary_header('Accept-Encoding')
+                    await send(start)
+                    return await send({'type': 'http.response.body', 'body': body})
+                await send(start)
+
+            if state['mode'] == 'stream':
+                encoder = state['encoder']
+                chunk = encoder.compress(message.get('body', b''))
+                more_body = message.get('more_body', False)
+                if not more_body:
+                    chunk += encoder.finish()
+                return await send({'type': 'http.response.body', 'body': chunk, 'more_body': more_body})
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+def from_settings(settings: Settings):
+    """Middleware options from the settings"""
+    return {
+        'minimum_size': settings.compression_min_size,
+        'level': settings.compression_level,
+    }
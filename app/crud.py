@@ -1,8 +1,37 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from app import models, schemas
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
+from sqlalchemy.orm import Query, Session, joinedload, selectinload, load_only
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import bindparam, or_, and_, select, insert, update, delete, func, case, union_all, literal, null, cast, tuple_, any_
+from app import models, schemas, events, database
 from passlib.context import CryptContext
 
+def insert_ignoring_conflicts(db: Session, model):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's database"""
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    return dialect_insert(model).on_conflict_do_nothing()
+
+def any_of(db: Session, column, ids):
+    """column = ANY(:ids) on PostgreSQL: one array parameter and one statement
+    shape however many ids there are. IN (...) elsewhere."""
+    if db.get_bind().dialect.name == 'postgresql':
+        return column == any_(literal(list(ids), postgresql.ARRAY(column.type)))
+    return column.in_(list(ids))
+
+def scatter_page(db: Session, statement, skip: int, limit: int, key):
+    """Rows skip..skip + limit of a Query or select(); from every shard when sharded.
+
+    Each shard returns its first skip + limit rows in `key` order, and the
+    merged rows are sorted and sliced, so deep pages cost more as shards are added.
+    """
+    if database.is_sharded():
+        statement = statement.order_by(key).limit(skip + limit).execution_options(all_shards=True)
+        rows = statement.all() if isinstance(statement, Query) else db.execute(statement).all()
+        return sorted(rows, key=attrgetter(key.key))[skip:skip + limit]
+    statement = statement.offset(skip).limit(limit)
+    return statement.all() if isinstance(statement, Query) else db.execute(statement).all()
+
 # Password hashing
 pwd_context = CryptContext(schemes=['bcrypt'])
 
@@ -13,28 +42,115 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_user_by_id(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    # Routed by id rather than to the pinned shard, so users on other shards are found too
+    return db.get(models.User, user_id, execution_options={'_sa_shard_id': database.shard_for_id(user_id)})
+
+# Hot lookups are built once with bound parameters: each call only binds
+# values, and SQLAlchemy reuses the compiled SQL from its statement cache
+USER_BY_EMAIL = select(models.User).where(models.User.email == bindparam('email')).limit(1)
 
 def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+    return db.scalars(USER_BY_EMAIL, {'email': email}).first()
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
 def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = hash_password(user.password)
-    db_user = models.User(
-        email=user.email,
-        username=user.username,
-        hashed_password=hashed_password
-    )
-    db.add(db_user)
+    """Register a user in one statement: INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Returns None when the email or username is taken. The unique constraints
+    decide, so two concurrent registrations cannot both get through; the
+    caller works out which one was taken.
+    """
+    database.pin_shard(db, database.shard_for_email(user.email))
+    users = insert_users(db, [{
+        'email': user.email,
+        'username': user.username,
+        'hashed_password': hash_password(user.password)
+    }])
+    return users[0] if users else None
+
+def insert_users(db: Session, rows: list):
+    """Insert user rows (email, username, hashed_password) with one multi-row
+    INSERT and commit; rows whose email or username is taken are skipped.
+    Returns the users that were inserted."""
+    ids = database.shard_aware_ids(db.connection(), models.User.__table__, len(rows))
+    if ids is not None:
+        rows = [dict(row, id=user_id) for row, user_id in zip(rows, ids)]
+    users = db.scalars(
+        insert_ignoring_conflicts(db, models.User).values(rows).returning(models.User),
+        execution_options={'synchronize_session': False}
+    ).all()
+    for db_user in users:
+        # Detached, so committing does not expire the RETURNING values
+        db.expunge(db_user)
     db.commit()
-    db.refresh(db_user)
-    return db_user
+    return users
+
+def get_existing_user_values(db: Session, column, values) -> set:
+    """The `values` of a unique users column (email, username) that are taken, on any shard"""
+    statement = select(column).where(any_of(db, column, values))
+    if database.is_sharded():
+        statement = statement.execution_options(all_shards=True)
+    return set(db.scalars(statement).all())
 
 def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+    return scatter_page(db, db.query(models.User), skip, limit, key=models.User.id)
+
+# Fuzzy matching only from this length on: shorter strings have too few trigrams
+TRIGRAM_MIN_LENGTH = 3
+
+def escape_like(value: str) -> str:
+    """Escape LIKE wildcards, for use with escape='/'"""
+    return value.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+def search_users(db: Session, q: str, limit: int = 10):
+    """Users whose username or email starts with `q`, alphabetically, then on
+    PostgreSQL users resembling it (pg_trgm similarity), best match first.
+
+    Each part is an index-driven top-`limit` query (see the user search
+    migration); the union is merged here, which also merges shards. Elsewhere
+    (tests), substring matches stand in for the fuzzy part.
+    """
+    User = models.User
+    q = q.strip().lower()
+    pattern = escape_like(q)
+    postgres = db.get_bind().dialect.name == 'postgresql'
+    columns = (User.id, User.username, User.email)
+    parts = []
+    for column in (User.username, User.email):
+        key = func.lower(column)
+        if postgres:
+            # Byte order: the prefix indexes serve both the LIKE and the ORDER BY
+            key = key.collate('C')
+        parts.append(
+            select(*columns, literal(0).label('rank'), literal(1.0).label('score'), key.label('matched'))
+            .where(key.like(pattern + '%', escape='/')).order_by(key).limit(limit)
+        )
+    username, email = func.lower(User.username), func.lower(User.email)
+    if postgres and len(q) >= TRIGRAM_MIN_LENGTH:
+        score = func.greatest(func.similarity(username, q), func.similarity(email, q))
+        parts.append(
+            select(*columns, literal(1).label('rank'), score.label('score'), literal('').collate('C').label('matched'))
+            .where(or_(username.op('%')(q), email.op('%')(q))).order_by(score.desc()).limit(limit)
+        )
+    elif not postgres:
+        contains = f'%{pattern}%'
+        parts.append(
+            select(*columns, literal(1).label('rank'), literal(0.0).label('score'), username.label('matched'))
+            .where(or_(username.like(contains, escape='/'), email.like(contains, escape='/'))).order_by(username).limit(limit)
+        )
+    statement = union_all(*(select(part.subquery()) for part in parts))
+    if database.is_sharded():
+        statement = statement.execution_options(all_shards=True)
+
+    # A user can match several parts; keep their best
+    best = {}
+    for row in db.execute(statement):
+        key = (row.rank, -row.score, row.matched, row.id)
+        if row.id not in best or key < best[row.id][0]:
+            best[row.id] = (key, row)
+    return [row for key, row in sorted(best.values())[:limit]]
 
 # Project CRUD operations
 def create_project(db: Session, project: schemas.ProjectCreate, owner_id: int):
@@ -44,34 +160,182 @@ def create_project(db: Session, project: schemas.ProjectCreate, owner_id: int):
         owner_id=owner_id
     )
     db.add(db_project)
+    events.emit_access_changed(db, [owner_id])
     db.commit()
     db.refresh(db_project)
     return db_project
 
+PROJECT_BY_ID = select(models.Project).where(
+    models.Project.id == bindparam('project_id'),
+    models.Project.deleted_at.is_(None)
+).limit(1)
+
+PROJECT_OWNER_BY_ID = select(models.Project.owner_id).where(
+    models.Project.id == bindparam('project_id'),
+    models.Project.deleted_at.is_(None)
+).limit(1)
+
 def get_project(db: Session, project_id: int):
-    return db.query(models.Project).filter(models.Project.id == project_id).first()
+    return db.scalars(PROJECT_BY_ID, {'project_id': project_id}).first()
 
-def get_projects(db: Session, owner_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).filter(models.Project.owner_id == owner_id).offset(skip).limit(limit).all()
+def get_project_owner_id(db: Session, project_id: int):
+    """Owner of a live project, or None; a plain row fetch for ownership checks"""
+    return db.scalars(PROJECT_OWNER_BY_ID, {'project_id': project_id}).first()
 
-def update_project(db: Session, project_id: int, project: schemas.ProjectUpdate):
-    db_project = get_project(db, project_id)
-    if db_project:
-        update_data = project.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(db_project, key, value)
-        db.commit()
-        db.refresh(db_project)
+def get_projects(db: Session, project_ids, skip: int = 0, limit: int = 100, fields=None):
+    """Projects among `project_ids` (a user's access set, see access.py)"""
+    query = db.query(models.Project)
+    if fields:
+        query = query.options(load_only(*(getattr(models.Project, name) for name in fields)))
+    return query.filter(
+        any_of(db, models.Project.id, project_ids),
+        models.Project.deleted_at.is_(None)
+    ).offset(skip).limit(limit).all()
+
+def get_projects_by_ids(db: Session, ids):
+    return db.query(models.Project).filter(
+        any_of(db, models.Project.id, ids),
+        models.Project.deleted_at.is_(None)
+    ).all()
+
+def update_project(db: Session, project_id: int, project: schemas.ProjectUpdate, owner_id: int, version: int = None):
+    """Conditional update in one statement: UPDATE ... WHERE id AND owner [AND version] RETURNING.
+
+    Returns the updated project, or None when nothing matched; the caller
+    works out whether that was a missing project, another owner's, or a stale version.
+    """
+    criteria = [
+        models.Project.id == project_id,
+        models.Project.owner_id == owner_id,
+        models.Project.deleted_at.is_(None)
+    ]
+    if version is not None:
+        criteria.append(models.Project.version == version)
+    db_project = db.scalars(
+        update(models.Project).where(*criteria).values(
+            **project.model_dump(exclude_unset=True), version=models.Project.version + 1
+        ).returning(models.Project),
+        execution_options={'synchronize_session': False}
+    ).one_or_none()
+    if db_project is not None:
+        # Detached, so committing does not expire the RETURNING values
+        db.expunge(db_project)
+    db.commit()
     return db_project
 
 def delete_project(db: Session, project_id: int):
+    """Soft-delete a project; its rows are removed later by purge_project"""
     db_project = get_project(db, project_id)
     if db_project:
-        db.delete(db_project)
+        db_project.deleted_at = func.now()
+        db.add(models.TaskTombstone(project_id=db_project.id, owner_id=db_project.owner_id))
+        events.emit(db, 'project.deleted', db_project.id)
+        events.emit_access_changed(db, [db_project.owner_id, *get_member_ids(db, db_project.id)])
         db.commit()
     return db_project
 
+def purge_project(db: Session, project_id: int, batch_size: int = 1000):
+    """Delete a soft-deleted project's tasks (hot and archived) in batches, then the project itself.
+
+    Each batch is its own short transaction so a large project never holds
+    row locks on the tasks table for long.
+    """
+    for model in (models.Task, models.TaskArchive):
+        batch = select(model.id).where(
+            model.project_id == project_id
+        ).limit(batch_size).scalar_subquery()
+        while True:
+            result = db.execute(
+                delete(model).where(model.project_id == project_id, model.id.in_(batch)),
+                execution_options={'synchronize_session': False}
+            )
+            db.commit()
+            if result.rowcount < batch_size:
+                break
+    db.execute(delete(models.ProjectMember).where(models.ProjectMember.project_id == project_id))
+    db.execute(
+        delete(models.Project).where(
+            models.Project.id == project_id,
+            models.Project.deleted_at.is_not(None)
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    db.commit()
+
+# Project members
+def get_accessible_projects(db: Session, user_id: int) -> dict:
+    """{project_id: role} of the live projects a user owns or is a member of, in one query"""
+    owned = select(models.Project.id, literal('owner')).where(
+        models.Project.owner_id == user_id,
+        models.Project.deleted_at.is_(None)
+    )
+    shared = select(models.ProjectMember.project_id, models.ProjectMember.role).join(
+        models.Project, models.Project.id == models.ProjectMember.project_id
+    ).where(
+        models.ProjectMember.user_id == user_id,
+        models.Project.deleted_at.is_(None)
+    )
+    return dict(db.execute(union_all(owned, shared)).all())
+
+def get_members(db: Session, project_id: int):
+    return db.scalars(
+        select(models.ProjectMember).where(models.ProjectMember.project_id == project_id).order_by(models.ProjectMember.user_id)
+    ).all()
+
+def get_member_ids(db: Session, project_id: int):
+    return db.scalars(select(models.ProjectMember.user_id).where(models.ProjectMember.project_id == project_id)).all()
+
+def set_member(db: Session, project_id: int, user_id: int, role: str):
+    """Add a member or change their role"""
+    dialect_insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(models.ProjectMember).values(project_id=project_id, user_id=user_id, role=role)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=['project_id', 'user_id'], set_={'role': statement.excluded.role}
+    ))
+    events.emit_access_changed(db, [user_id])
+    db.commit()
+    return db.get(models.ProjectMember, (project_id, user_id), populate_existing=True)
+
+def remove_member(db: Session, project_id: int, user_id: int) -> bool:
+    result = db.execute(delete(models.ProjectMember).where(
+        models.ProjectMember.project_id == project_id,
+        models.ProjectMember.user_id == user_id
+    ))
+    if result.rowcount:
+        events.emit_access_changed(db, [user_id])
+    db.commit()
+    return result.rowcount > 0
+
+# Activity log (written by app.activity)
+def get_activity(db: Session, project_id: int, before=None, limit: int = 50):
+    """A project's activity, newest first, older than the (created_at, id) cursor `before`"""
+    Activity = models.ActivityLog
+    query = select(Activity).where(Activity.project_id == project_id)
+    if before is not None:
+        created_at, activity_id = before
+        # The first condition is what the (project_id, created_at) index can use
+        query = query.where(
+            Activity.created_at <= created_at,
+            or_(Activity.created_at < created_at, Activity.id < activity_id)
+        )
+    return db.scalars(query.order_by(Activity.created_at.desc(), Activity.id.desc()).limit(limit)).all()
+
+def get_deleted_project_ids(db: Session):
+    return db.scalars(select(models.Project.id).where(models.Project.deleted_at.is_not(None))).all()
+
 # Task CRUD operations
+
+# Relationships a task response can be expanded with, and how each is loaded.
+# Many-to-one project is joined in; users are batched with one SELECT ... IN.
+TASK_EXPAND_OPTIONS = {
+    'project': joinedload(models.Task.project, innerjoin=True),
+    'assignee': selectinload(models.Task.assignee),
+    'creator': selectinload(models.Task.creator),
+}
+
+def task_load_options(expand=()):
+    return [TASK_EXPAND_OPTIONS[name] for name in expand]
+
 def create_task(db: Session, task: schemas.TaskCreate, created_by: int):
     db_task = models.Task(
         title=task.title,
@@ -84,36 +348,234 @@ def create_task(db: Session, task: schemas.TaskCreate, created_by: int):
         due_date=task.due_date
     )
     db.add(db_task)
+    db.flush()
+    events.emit(db, 'task.created', db_task.project_id, db_task.id)
     db.commit()
     db.refresh(db_task)
     return db_task
 
-def get_task(db: Session, task_id: int):
-    return db.query(models.Task).filter(models.Task.id == task_id).first()
+@lru_cache(maxsize=None)
+def task_by_id(expand=()):
+    """Prebuilt task lookup for one combination of expanded relationships"""
+    return select(models.Task).options(*task_load_options(expand)).where(
+        models.Task.id == bindparam('task_id')
+    ).limit(1)
+
+def get_task(db: Session, task_id: int, expand=()):
+    return db.scalars(task_by_id(tuple(expand)), {'task_id': task_id}).unique().first()
+
+def get_tasks_by_ids(db: Session, ids):
+    """Tasks with the owner of their project, for ownership checks, in one query"""
+    return db.query(models.Task, models.Project.owner_id).join(
+        models.Project, models.Project.id == models.Task.project_id
+    ).filter(
+        any_of(db, models.Task.id, ids),
+        models.Project.deleted_at.is_(None)
+    ).all()
 
-def get_tasks_by_project(db: Session, project_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Task).filter(
+def get_tasks_by_project(db: Session, project_id: int, skip: int = 0, limit: int = 100, expand=()):
+    return db.query(models.Task).options(*task_load_options(expand)).filter(
         models.Task.project_id == project_id
     ).offset(skip).limit(limit).all()
 
-def get_tasks_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(models.Task).filter(
-        models.Task.assigned_to == user_id
+def get_tasks_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100, expand=()):
+    return db.query(models.Task).options(*task_load_options(expand)).join(models.Task.project).filter(
+        models.Task.assigned_to == user_id,
+        models.Project.deleted_at.is_(None)
     ).offset(skip).limit(limit).all()
 
-def update_task(db: Session, task_id: int, task: schemas.TaskUpdate):
-    db_task = get_task(db, task_id)
-    if db_task:
-        update_data = task.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(db_task, key, value)
-        db.commit()
-        db.refresh(db_task)
+def apply_task_update(db: Session, task_id: int, values: dict, project_ids, version: int = None):
+    """The conditional UPDATE of update_task, without committing, so several
+    updates can share one transaction. Returns the detached task or None."""
+    criteria = [models.Task.id == task_id, any_of(db, models.Task.project_id, project_ids)]
+    if version is not None:
+        criteria.append(models.Task.version == version)
+    db_task = db.scalars(
+        update(models.Task).where(*criteria).values(**values, version=models.Task.version + 1).returning(models.Task),
+        execution_options={'synchronize_session': False}
+    ).one_or_none()
+    if db_task is not None:
+        events.emit(db, 'task.updated', db_task.project_id, db_task.id)
+        # Detached, so committing does not expire the RETURNING values
+        db.expunge(db_task)
+    return db_task
+
+def update_task(db: Session, task_id: int, task: schemas.TaskUpdate, project_ids, version: int = None):
+    """Conditional update in one statement, like update_project; only tasks in
+    `project_ids` (the projects the user may edit) match."""
+    db_task = apply_task_update(db, task_id, task.model_dump(exclude_unset=True), project_ids, version)
+    db.commit()
     return db_task
 
 def delete_task(db: Session, task_id: int):
     db_task = get_task(db, task_id)
     if db_task:
+        events.emit(db, 'task.deleted', db_task.project_id, db_task.id)
+        db.execute(insert(models.TaskTombstone).from_select(
+            ['task_id', 'project_id', 'owner_id'],
+            select(literal(db_task.id), models.Project.id, models.Project.owner_id).where(
+                models.Project.id == db_task.project_id
+            )
+        ))
         db.delete(db_task)
         db.commit()
     return db_task
+
+# Delta sync
+SYNC_START = (-1, 0, 0)
+
+def get_changes(db: Session, owner_id: int, after=SYNC_START, limit: int = 500):
+    """Tasks written and tombstones recorded after the `after` cursor.
+
+    Cursors are (change_seq, kind, id) with kind 0 for tasks and 1 for
+    tombstones. Rows are returned in cursor order and only below
+    change_horizon(), so a transaction that commits late can never slip in
+    behind a cursor that was already handed out. Returns (rows, has_more).
+    """
+    task_columns = [column for column in models.Task.__table__.c if column.name not in ('id', 'project_id', 'change_seq')]
+    live_projects = select(models.Project.id).where(
+        models.Project.owner_id == owner_id,
+        models.Project.deleted_at.is_(None)
+    )
+    tombstone = models.TaskTombstone
+    changes = union_all(
+        select(
+            literal(0).label('kind'), models.Task.id.label('key'), models.Task.change_seq,
+            models.Task.project_id, models.Task.id.label('task_id'),
+            cast(null(), tombstone.deleted_at.type).label('deleted_at'), *task_columns
+        ).where(models.Task.project_id.in_(live_projects), models.Task.change_seq >= after[0]),
+        select(
+            literal(1), tombstone.id, tombstone.change_seq,
+            tombstone.project_id, tombstone.task_id,
+            tombstone.deleted_at, *(cast(null(), column.type).label(column.name) for column in task_columns)
+        ).where(tombstone.owner_id == owner_id, tombstone.change_seq >= after[0])
+    ).subquery()
+    rows = db.execute(
+        select(changes).where(
+            tuple_(changes.c.change_seq, changes.c.kind, changes.c.key) > tuple_(*after),
+            changes.c.change_seq < models.change_horizon()
+        ).order_by(changes.c.change_seq, changes.c.kind, changes.c.key).limit(limit + 1)
+    ).all()
+    return rows[:limit], len(rows) > limit
+
+def delete_tombstones(db: Session, older_than):
+    result = db.execute(delete(models.TaskTombstone).where(models.TaskTombstone.deleted_at < older_than))
+    db.commit()
+    return result.rowcount
+
+# Task archive (cold tier)
+TASK_COLUMNS = [column.name for column in models.Task.__table__.columns]
+
+def select_all_tiers(where, columns=TASK_COLUMNS):
+    """tasks UNION ALL tasks_archive as a subquery.
+
+    `where(table)` returns the filters for one tier, so each branch of the union
+    is filtered (and can use its own indexes) before the rows are combined.
+    """
+    return union_all(*(
+        select(*(table.c[name] for name in columns)).where(*where(table))
+        for table in (models.Task.__table__, models.TaskArchive.__table__)
+    )).subquery()
+
+def get_tasks_all_tiers(db: Session, where, skip: int = 0, limit: int = 100, columns=TASK_COLUMNS, all_shards: bool = False):
+    tasks = select_all_tiers(where, columns)
+    if all_shards:
+        return scatter_page(db, select(tasks), skip, limit, key=tasks.c.id)
+    return db.execute(select(tasks).order_by(tasks.c.id).offset(skip).limit(limit)).all()
+
+def archive_done_tasks(db: Session, older_than, batch_size: int = 1000):
+    """Move done tasks last touched before `older_than` into tasks_archive.
+
+    Works in batches of `batch_size`, one transaction each. Rows being archived
+    are locked with SKIP LOCKED so concurrent runs split the work.
+    Returns the number of tasks archived.
+    """
+    archived = 0
+    while True:
+        ids = db.scalars(
+            select(models.Task.id).where(
+                models.Task.status == 'done',
+                or_(
+                    models.Task.updated_at < older_than,
+                    and_(models.Task.updated_at.is_(None), models.Task.created_at < older_than)
+                )
+            ).order_by(models.Task.id).limit(batch_size).with_for_update(skip_locked=True)
+        ).all()
+        if ids:
+            columns = [models.Task.__table__.c[name] for name in TASK_COLUMNS]
+            db.execute(insert(models.TaskArchive).from_select(
+                TASK_COLUMNS, select(*columns).where(models.Task.id.in_(ids))
+            ))
+            db.execute(
+                delete(models.Task).where(models.Task.id.in_(ids)),
+                execution_options={'synchronize_session': False}
+            )
+        db.commit()
+        archived += len(ids)
+        if len(ids) < batch_size:
+            return archived
+
+def task_counters(tasks, now: datetime):
+    """Counter conditions over a tasks selectable, keyed by stat name"""
+    return {
+        'todo': tasks.c.status == 'todo',
+        'in_progress': tasks.c.status == 'in_progress',
+        'done': tasks.c.status == 'done',
+        'high_priority': tasks.c.priority == 'high',
+        'medium_priority': tasks.c.priority == 'medium',
+        'low_priority': tasks.c.priority == 'low',
+        'unassigned': tasks.c.assigned_to.is_(None),
+        'overdue': and_(tasks.c.status != 'done', tasks.c.due_date < now),
+    }
+
+STAT_NAMES = (
+    'total_tasks', 'todo', 'in_progress', 'done', 'high_priority',
+    'medium_priority', 'low_priority', 'unassigned', 'overdue'
+)
+STAT_COLUMNS = ['id', 'project_id', 'status', 'priority', 'assigned_to', 'due_date']
+
+def get_project_stats(db: Session, project_id: int):
+    """Task counters for a project, computed in SQL across both tiers"""
+    tasks = select_all_tiers(lambda table: [table.c.project_id == project_id], columns=STAT_COLUMNS)
+    counters = task_counters(tasks, datetime.now(timezone.utc))
+    row = db.execute(select(
+        func.count().label('total_tasks'),
+        *(func.count(case((condition, 1))).label(name) for name, condition in counters.items())
+    ).select_from(tasks)).one()
+    return dict(row._mapping)
+
+def get_owner_stats(db: Session, owner_id: int, cached: bool = False):
+    """Task counters for every project of an owner, in one grouped query.
+
+    With cached=True on PostgreSQL the counters are read from the
+    project_task_stats materialized view instead of being counted.
+    Returns (rows, refreshed_at); refreshed_at is None for live counters.
+    """
+    Project = models.Project
+    owned = [Project.owner_id == owner_id, Project.deleted_at.is_(None)]
+    if cached and db.get_bind().dialect.name == 'postgresql':
+        stats = models.project_task_stats
+        rows = db.execute(
+            select(
+                Project.id.label('project_id'), Project.name,
+                *(func.coalesce(stats.c[name], 0).label(name) for name in STAT_NAMES),
+                stats.c.refreshed_at
+            ).select_from(Project).outerjoin(stats, stats.c.project_id == Project.id)
+            .where(*owned).order_by(Project.id)
+        ).all()
+        refreshed = [row.refreshed_at for row in rows if row.refreshed_at is not None]
+        return [dict(row._mapping) for row in rows], min(refreshed, default=None)
+
+    # Filter each tier to the owner's projects before the union so both use their project_id index
+    owned_ids = select(Project.id).where(*owned)
+    tasks = select_all_tiers(lambda table: [table.c.project_id.in_(owned_ids)], columns=STAT_COLUMNS)
+    counters = task_counters(tasks, datetime.now(timezone.utc))
+    rows = db.execute(
+        select(
+            Project.id.label('project_id'), Project.name,
+            func.count(tasks.c.id).label('total_tasks'),
+            *(func.count(case((condition, 1))).label(name) for name, condition in counters.items())
+        ).select_from(Project).outerjoin(tasks, tasks.c.project_id == Project.id)
+        .where(*owned).group_by(Project.id, Project.name).order_by(Project.id)
+    ).all()
+    return [dict(row._mapping) for row in rows], None
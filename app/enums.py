@@ -9,3 +9,7 @@ class TaskPriority(str, Enum):
     LOW = 'low'
     MEDIUM = 'medium'
     HIGH = 'high'
+
+class ProjectRole(str, Enum):
+    VIEWER = 'viewer' # read the project and its tasks
+    EDITOR = 'editor' # also create, update and delete tasks
@@ -0,0 +1,246 @@
+"""Task change feed.
+
+crud emits an event for every task mutation with emit(). On PostgreSQL the
+event is sent with NOTIFY inside the writing transaction, so it is delivered
+only if the transaction commits. Each worker keeps one LISTEN connection,
+shared by all of its subscribers, and feeds the events to the in-process
+broker. On other databases (tests), events go straight to the broker after
+commit. Project access changes (emit_access_changed) travel the same way and
+are handed to the callbacks registered with broker.add_handler.
+
+Each subscriber has a bounded queue. A subscriber that falls behind is not
+allowed to grow memory: its queue is replaced by a single 'resync' event, and
+the client is expected to refetch and reconnect.
+
+The LISTEN connection is reopened with backoff whenever it fails (e.g. a
+database restart or failover). Notifications sent while it was down are lost,
+so after every LISTEN the listener publishes LISTENING, and on a reconnect
+every subscriber gets 'resync'; the access cache drops everything on
+LISTENING.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app import database
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'task_events'
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+RESYNC = {'type': 'resync'}
+# Published by the listener each time it starts listening
+LISTENING = 'listener.listening'
+RECONNECT_MIN_SECONDS = 1
+RECONNECT_MAX_SECONDS = 30
+
+class Subscription:
+    def __init__(self, project_id: int, loop, queue_size: int = QUEUE_SIZE):
+        self.project_id = project_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def offer(self, event):
+        """Queue an event; runs on the subscriber's event loop"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def stream(self, heartbeat: float = HEARTBEAT_SECONDS):
+        """Yield events, or None when `heartbeat` seconds pass without one"""
+        while True:
+            try:
+                event = await asyncio.wait_for(self.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield event
+            if event is RESYNC:
+                return
+
+class EventBroker:
+    """Fans events out to the subscribers of a project within one worker"""
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._handlers = defaultdict(list) # event type -> callbacks, for events without a project
+        self._lock = threading.Lock()
+
+    def add_handler(self, event_type: str, handler):
+        """Call `handler(event)` for every published event of `event_type`"""
+        with self._lock:
+            self._handlers[event_type].append(handler)
+
+    def subscribe(self, project_id: int) -> Subscription:
+        subscription = Subscription(project_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers[project_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.project_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.project_id]
+
+    def publish(self, event: dict):
+        """Thread-safe; hands the event to each subscriber's loop"""
+        with self._lock:
+            handlers = list(self._handlers.get(event['type'], ()))
+            subscribers = list(self._subscribers.get(event.get('project_id'), ()))
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception:
+                logger.exception('Handler for %s failed', event['type'])
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.offer, event)
+
+    def resync(self):
+        """Send 'resync' to every subscriber, after events may have been missed"""
+        with self._lock:
+            subscribers = [subscription for project in self._subscribers.values() for subscription in project]
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.offer, RESYNC)
+
+broker = EventBroker()
+
+class PostgresListener(threading.Thread):
+    """One LISTEN connection per worker, publishing notifications to the broker"""
+    def __init__(self, broker: EventBroker, engine, poll_seconds: float = 5.0):
+        super().__init__(name='task-events-listener', daemon=True)
+        self.broker = broker
+        self.engine = engine
+        self.poll_seconds = poll_seconds
+        self.stopped = threading.Event()
+        self.listening = threading.Event()
+
+    def run(self):
+        backoff = RECONNECT_MIN_SECONDS
+        reconnect = False
+        while not self.stopped.is_set():
+            try:
+                self.listen(reconnect)
+            except Exception:
+                if self.listening.is_set():
+                    # It was working; start the backoff over
+                    self.listening.clear()
+                    reconnect = True
+                    backoff = RECONNECT_MIN_SECONDS
+                logger.warning('Event listener connection failed, retrying in %s s', backoff, exc_info=True)
+                if self.stopped.wait(backoff):
+                    return
+                backoff = min(backoff * 2, RECONNECT_MAX_SECONDS)
+
+    def listen(self, reconnect: bool):
+        """LISTEN and publish notifications until stopped or the connection fails"""
+        connection = self.engine.raw_connection()
+        connection.detach()  # a dedicated connection, never returned to the pool
+        try:
+            dbapi_connection = connection.driver_connection
+            dbapi_connection.autocommit = True
+            dbapi_connection.cursor().execute(f'LISTEN {CHANNEL}')
+            self.listening.set()
+            # Anything sent before the LISTEN above is lost
+            self.broker.publish({'type': LISTENING})
+            if reconnect:
+                self.broker.resync()
+            while not self.stopped.is_set():
+                if select.select([dbapi_connection], [], [], self.poll_seconds) == ([], [], []):
+                    continue
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notification = dbapi_connection.notifies.pop(0)
+                    try:
+                        event = json.loads(notification.payload)
+                    except ValueError:
+                        logger.warning('Ignoring malformed notification %r', notification.payload)
+                        continue
+                    self.broker.publish(event)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+_listeners = []
+_listener_lock = threading.Lock()
+
+def start_listener(wait: float = 0):
+    """Start this worker's LISTEN threads, one per shard (PostgreSQL only, idempotent).
+
+    With `wait`, block for up to that many seconds until every thread is listening.
+    """
+    global _listeners
+    engines = database.get_engines()
+    if engines[0].dialect.name != 'postgresql':
+        return
+    with _listener_lock:
+        if not _listeners or not all(listener.is_alive() for listener in _listeners):
+            for listener in _listeners:
+                listener.stop()
+            _listeners = [PostgresListener(broker, engine) for engine in engines]
+            for listener in _listeners:
+                listener.start()
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener.listening.wait(wait)
+
+def stop_listener():
+    global _listeners
+    with _listener_lock:
+        for listener in _listeners:
+            listener.stop()
+        _listeners = []
+
+def emit(db: Session, event_type: str, project_id: int, task_id: int = None):
+    """Record a change event as part of the session's current transaction"""
+    payload = {'type': event_type, 'project_id': project_id, 'task_id': task_id}
+    if db.get_bind().dialect.name == 'postgresql':
+        db.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': json.dumps(payload)})
+    else:
+        db.info.setdefault('pending_events', []).append(payload)
+
+# More user ids than this and every worker drops its whole access cache;
+# NOTIFY payloads are limited to 8000 bytes
+MAX_ACCESS_USER_IDS = 500
+
+def emit_access_changed(db: Session, user_ids):
+    """Have every worker drop its cached project access of `user_ids` (see
+    access.py) once the session's transaction commits"""
+    user_ids = sorted(set(user_ids))
+    payload = {'type': 'access.changed', 'user_ids': user_ids if len(user_ids) <= MAX_ACCESS_USER_IDS else None}
+    if db.get_bind().dialect.name == 'postgresql':
+        db.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': json.dumps(payload)})
+    # This worker as well, right after commit rather than via LISTEN
+    db.info.setdefault('pending_events', []).append(payload)
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending_events(session):
+    for payload in session.info.pop('pending_events', ()):
+        broker.publish(payload)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending_events(session, previous_transaction):
+    session.info.pop('pending_events', None)
+
+def format_sse(event) -> str:
+    """Server-Sent Events frame; a comment line serves as heartbeat"""
+    if event is None:
+        return ': heartbeat\n\n'
+    return f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
@@ -20,3 +20,19 @@ class ForbiddenException(HTTPException):
 class BadRequestException(HTTPException):
     def __init__(self, detail: str):
         super().__init__(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+class GoneException(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_410_GONE, detail=detail)
+
+class PreconditionFailedException(HTTPException):
+    def __init__(self, detail: str, headers: dict = None):
+        super().__init__(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=detail, headers=headers)
+
+class ServiceUnavailableException(HTTPException):
+    def __init__(self, detail: str, headers: dict = None):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail, headers=headers)
+
+class ConflictException(HTTPException):
+    def __init__(self, detail: str):
+        super().__init__(status_code=status.HTTP_409_CONFLICT, detail=detail)
@@ -0,0 +1,103 @@
+"""Background jobs. Each job opens its own session, since request sessions
+are closed by the time FastAPI runs background tasks."""
+import argparse
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from app.database import SessionLocal, pin_shard, shard_for_id, shard_sessions
+from app import crud, database, provisioning
+
+PURGE_BATCH_SIZE = 1000
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_AFTER = timedelta(days=30)
+# Sync tokens older than this are rejected, since deletions may have been forgotten
+TOMBSTONE_RETENTION = timedelta(days=90)
+
+def purge_project(project_id: int):
+    """Remove a soft-deleted project and its tasks"""
+    db = pin_shard(SessionLocal(), shard_for_id(project_id))
+    try:
+        crud.purge_project(db, project_id, batch_size=PURGE_BATCH_SIZE)
+    finally:
+        db.close()
+
+# The jobs below run once per shard (once when not sharded)
+
+def purge_deleted_projects():
+    """Finish purges that were interrupted, e.g. by a worker restart"""
+    for db in shard_sessions():
+        for project_id in crud.get_deleted_project_ids(db):
+            crud.purge_project(db, project_id, batch_size=PURGE_BATCH_SIZE)
+
+def archive_done_tasks(older_than: timedelta = ARCHIVE_AFTER):
+    """Move tasks that have been done for longer than `older_than` to tasks_archive"""
+    cutoff = datetime.now(timezone.utc) - older_than
+    return sum(crud.archive_done_tasks(db, cutoff, batch_size=ARCHIVE_BATCH_SIZE) for db in shard_sessions())
+
+def prune_tombstones(older_than: timedelta = TOMBSTONE_RETENTION):
+    """Forget deletions older than the sync token lifetime"""
+    cutoff = datetime.now(timezone.utc) - older_than
+    return sum(crud.delete_tombstones(db, cutoff) for db in shard_sessions())
+
+def refresh_project_stats():
+    """Refresh the project_task_stats materialized view (PostgreSQL only)"""
+    refreshed = False
+    for db in shard_sessions():
+        if db.get_bind().dialect.name != 'postgresql':
+            continue
+        # CONCURRENTLY keeps the view readable during the refresh
+        db.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY project_task_stats'))
+        db.commit()
+        refreshed = True
+    return refreshed
+
+SHARDED_TABLES = ('users', 'projects', 'tasks')
+
+def init_shard_sequences():
+    """Make each PostgreSQL shard's id sequences hand out ids with id % N == shard.
+
+    Run once after migrating the shards, and again when the shard count changes.
+    """
+    count = len(database.get_engines())
+    for shard, db in enumerate(shard_sessions()):
+        if db.get_bind().dialect.name != 'postgresql':
+            continue
+        for table in SHARDED_TABLES:
+            sequence = db.scalar(text(f"SELECT pg_get_serial_sequence('{table}', 'id')"))
+            db.execute(text(f'ALTER SEQUENCE {sequence} INCREMENT BY {count}'))
+            # Next id: the first one above the current maximum that belongs to this shard
+            db.execute(text(
+                f"SELECT setval('{sequence}', (coalesce(max(id), 0) / {count} + 1) * {count} + {shard}, false) FROM {table}"
+            ))
+        db.commit()
+
+if __name__ == '__main__':
+    # e.g. from cron: python -m app.jobs archive-tasks --days 30
+    parser = argparse.ArgumentParser(description='Task Management API maintenance jobs')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('purge-projects', help='remove soft-deleted projects')
+    archive = commands.add_parser('archive-tasks', help='move old done tasks to the archive')
+    archive.add_argument('--days', type=int, default=ARCHIVE_AFTER.days)
+    commands.add_parser('prune-tombstones', help='forget deletions older than the sync token lifetime')
+    commands.add_parser('refresh-stats', help='refresh the project_task_stats materialized view')
+    commands.add_parser('init-shards', help='set up shard-aware id sequences on PostgreSQL shards')
+    provision = commands.add_parser('provision-users', help='create users from a CSV file (email,username,password)')
+    provision.add_argument('file')
+    provision.add_argument('--workers', type=int, default=None, help='hashing processes (default: one per core)')
+    args = parser.parse_args()
+
+    if args.command == 'purge-projects':
+        purge_deleted_projects()
+    elif args.command == 'archive-tasks':
+        print(f'Archived {archive_done_tasks(timedelta(days=args.days))} tasks')
+    elif args.command == 'prune-tombstones':
+        print(f'Pruned {prune_tombstones()} tombstones')
+    elif args.command == 'refresh-stats':
+        print('Refreshed project_task_stats' if refresh_project_stats() else 'Nothing to refresh (not PostgreSQL)')
+    elif args.command == 'init-shards':
+        init_shard_sequences()
+    elif args.command == 'provision-users':
+        with open(args.file, newline='', encoding='utf-8-sig') as stream:
+            result = provisioning.provision_users(provisioning.read_csv(stream), workers=args.workers)
+        for entry in result['skipped']:
+            print(f'Skipped line {entry["line"]} ({entry["email"]}): {entry["detail"]}')
+        print(f'Created {result["created"]} users, skipped {len(result["skipped"])}')
@@ -1,99 +1,246 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+import asyncio
+import base64
+import csv
+import hashlib
+import hmac
+import io
+import time
+from datetime import datetime
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Request, status, BackgroundTasks, Response, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
 from typing import List
 
-from app.database import get_db
-from app import crud, schemas, models, auth
+from app.config import Settings, get_settings, use_settings
+from app.database import get_db, SessionLocal
+from app.access import get_current_access
+from app import crud, schemas, models, auth, jobs, events, ratelimit, reminders, compression, database, startup, coalescer, profiling, admission, access, activity, search, provisioning
 
 from fastapi.security import OAuth2PasswordRequestForm
 from typing import List, Optional
-from app.exceptions import NotFoundException, UnauthorizedException, ForbiddenException, BadRequestException
+from app.exceptions import NotFoundException, UnauthorizedException, ForbiddenException, BadRequestException, GoneException, PreconditionFailedException, ServiceUnavailableException, ConflictException
 
-app = FastAPI(title='Task Management API', version='1.0.0')
+router = APIRouter(route_class=profiling.ProfiledRoute)
 
-@app.get('/')
+@router.get('/')
 def read_root():
     return {'message': 'Task Management API'}
 
-@app.post('/users/', response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
+@router.post('/users/', response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    # Check if user already exists
-    if crud.get_user_by_email(db, email=user.email):
-        raise BadRequestException('Email already registered')
-    if crud.get_user_by_username(db, username=user.username):
+    if database.is_sharded() and crud.get_user_by_username(db, username=user.username):
+        # Usernames are only unique within a shard
         raise BadRequestException('Username already taken')
-    return crud.create_user(db=db, user=user)
+    db_user = crud.create_user(db=db, user=user)
+    if db_user is None:
+        if crud.get_user_by_email(db, email=user.email):
+            raise BadRequestException('Email already registered')
+        raise BadRequestException('Username already taken')
+    search.cache.clear()
+    return db_user
+
+MAX_BULK_USERS = 10_000
 
-@app.get('/users/', response_model=List[schemas.UserResponse])
+@router.post('/users/bulk', response_model=schemas.BulkUserResult)
+def provision_users(file: UploadFile, admin: schemas.UserResponse = Depends(auth.get_current_admin)):
+    """Create users from an uploaded CSV (email,username,password); admin only"""
+    try:
+        rows = provisioning.read_csv(io.TextIOWrapper(file.file, encoding='utf-8-sig', newline=''), limit=MAX_BULK_USERS)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise BadRequestException(str(e))
+    result = provisioning.provision_users(rows)
+    search.cache.clear()
+    return result
+
+@router.get('/users/', response_model=List[schemas.UserResponse])
 def get_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: schemas.UserResponse = Depends(auth.get_current_user)):
     users = crud.get_users(db=db, skip=skip, limit=limit)
     return users
 
-@app.get('/users/{user_id}', response_model=schemas.UserResponse)
+MAX_SEARCH_RESULTS = 50
+
+# Must be registered before /users/{user_id}
+@router.get('/users/search', response_model=List[schemas.UserSearchResult])
+def search_users(
+    q: str,
+    limit: int = 10,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+):
+    """Users by username or email prefix, then by similarity; for assignee pickers"""
+    if not q.strip():
+        raise BadRequestException('q must not be empty')
+    if len(q) > 100:
+        raise BadRequestException('q must be at most 100 characters')
+    return search.search_users(db, q, max(1, min(limit, MAX_SEARCH_RESULTS)))
+
+@router.get('/users/{user_id}', response_model=schemas.UserResponse)
 def get_user(user_id: int, db: Session = Depends(get_db), current_user: schemas.UserResponse = Depends(auth.get_current_user)):
     user = crud.get_user_by_id(db=db, user_id=user_id)
     if user is None:
         raise NotFoundException('User not found')
     return user
 
-@app.post('/auth/login', response_model=schemas.Token)
+@router.post('/auth/login', response_model=schemas.Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = auth.authenticate_user(db, email=form_data.username, password=form_data.password)
     if not user:
         raise UnauthorizedException('Incorrect email or password')
     
-    access_token = auth.create_access_token(data={'sub': user.email})
+    # uid lets the rate limiter key on the user without a database lookup
+    access_token = auth.create_access_token(data={'sub': user.email, 'uid': user.id})
     return {'access_token': access_token, 'token_type': 'bearer'}
 
+# Sparse fieldsets
+def parse_fields(schema):
+    """Dependency parsing ?fields=id,title into field names of `schema`"""
+    def fields_dependency(fields: Optional[str] = None):
+        if not fields:
+            return None
+        requested = {name.strip() for name in fields.split(',') if name.strip()} | {'id'}
+        unknown = requested - schema.model_fields.keys()
+        if unknown:
+            raise BadRequestException(f'Unknown fields: {", ".join(sorted(unknown))}')
+        # Schema order, so every spelling of a field set shares one cached adapter
+        return tuple(name for name in schema.model_fields if name in requested)
+    return fields_dependency
+
+def sparse_response(schema, fields, rows):
+    adapter = schemas.sparse_list_adapter(schema, fields)
+    return Response(adapter.dump_json(adapter.validate_python(rows, from_attributes=True)), media_type='application/json')
+
 # Project endpoints
-@app.post('/projects/', response_model=schemas.ProjectResponse, status_code=status.HTTP_201_CREATED)
+@router.post('/projects/', response_model=schemas.ProjectResponse, status_code=status.HTTP_201_CREATED)
 def create_project(
     project: schemas.ProjectCreate,
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(auth.get_current_user)
 ):
-    return crud.create_project(db=db, project=project, owner_id=current_user.id)
+    db_project = crud.create_project(db=db, project=project, owner_id=current_user.id)
+    activity.record(current_user.id, 'project.created', db_project.id, changes=project.model_dump(mode='json'))
+    return db_project
 
-@app.get('/projects/', response_model=List[schemas.ProjectResponse])
+@router.get('/projects/', response_model=List[schemas.ProjectResponse])
 def get_projects(
     skip: int = 0,
     limit: int = 100,
+    fields: Optional[tuple] = Depends(parse_fields(schemas.ProjectResponse)),
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_access: dict = Depends(get_current_access)
 ):
-    projects = crud.get_projects(db=db, owner_id=current_user.id, skip=skip, limit=limit)
+    """Projects the user owns or that are shared with them"""
+    projects = crud.get_projects(db=db, project_ids=list(current_access), skip=skip, limit=limit, fields=fields)
+    if fields:
+        return sparse_response(schemas.ProjectResponse, fields, projects)
     return projects
 
-@app.get('/projects/{project_id}', response_model=schemas.ProjectResponse)
+MAX_BATCH_IDS = 500
+
+def parse_ids(ids: str):
+    """Parse ?ids=1,2,3 into a list of unique ids, in request order"""
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(',') if part.strip()))
+    except ValueError:
+        raise BadRequestException('ids must be a comma-separated list of integers')
+    if not parsed:
+        raise BadRequestException('No ids given')
+    if len(parsed) > MAX_BATCH_IDS:
+        raise BadRequestException(f'At most {MAX_BATCH_IDS} ids per request')
+    return parsed
+
+@router.get('/projects/batch', response_model=schemas.ProjectBatchResponse)
+def get_projects_by_ids(
+    ids: list = Depends(parse_ids),
+    db: Session = Depends(get_db),
+    current_access: dict = Depends(get_current_access)
+):
+    found = {project.id: project for project in crud.get_projects_by_ids(db, ids)}
+    batch = {'items': [], 'missing': [], 'forbidden': []}
+    for project_id in ids:
+        project = found.get(project_id)
+        if project is None:
+            batch['missing'].append(project_id)
+        elif not access.can(current_access, project_id):
+            batch['forbidden'].append(project_id)
+        else:
+            batch['items'].append(project)
+    return batch
+
+# Must be registered before /projects/{project_id}
+@router.get('/projects/stats', response_model=schemas.OwnerStatsResponse)
+def get_owner_stats(
+    cached: bool = False,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+):
+    """Task counters for each project of the current user, and their totals"""
+    projects, refreshed_at = crud.get_owner_stats(db, current_user.id, cached=cached)
+    totals = {name: sum(project[name] for project in projects) for name in crud.STAT_NAMES}
+    return {'projects': projects, 'totals': totals, 'refreshed_at': refreshed_at}
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+def parse_if_match(if_match: Optional[str] = Header(None)):
+    """If-Match: "<version>" -> the version the update must apply to; None for no header or *.
+
+    Proxies that compress responses (nginx gzip, for one) weaken the tag to
+    W/"<version>". The version still names the row state exactly, so the W/ is
+    ignored rather than failing RFC 7232's strong comparison. A tag that is not
+    a version can never match, so it fails the precondition (412).
+    """
+    if if_match is None or if_match.strip() == '*':
+        return None
+    try:
+        return int(if_match.strip().removeprefix('W/').strip('"'))
+    except ValueError:
+        raise PreconditionFailedException('If-Match does not match the current version')
+
+@router.get('/projects/{project_id}', response_model=schemas.ProjectResponse)
 def get_project(
     project_id: int,
+    response: Response,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_access: dict = Depends(get_current_access)
 ):
     project = crud.get_project(db=db, project_id=project_id)
     if project is None:
         raise NotFoundException('Project not found')
-    if project.owner_id != current_user.id:
+    if not access.can(current_access, project_id):
         raise ForbiddenException('Forbidden to access this project')
+    response.headers['ETag'] = version_etag(project.version)
     return project
 
-@app.put('/projects/{project_id}', response_model=schemas.ProjectResponse)
+@router.put('/projects/{project_id}', response_model=schemas.ProjectResponse)
 def update_project(
     project_id: int,
     project: schemas.ProjectUpdate,
+    response: Response,
+    version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(auth.get_current_user)
 ):
-    db_project = crud.get_project(db=db, project_id=project_id)
+    db_project = crud.update_project(db=db, project_id=project_id, project=project, owner_id=current_user.id, version=version)
     if db_project is None:
-        raise NotFoundException('Project not found')
-    if db_project.owner_id != current_user.id:
-        raise ForbiddenException('Forbidden to update this project')
-    return crud.update_project(db=db, project_id=project_id, project=project)
+        # Only failed updates pay for a second query, to pick the right error
+        db_project = crud.get_project(db=db, project_id=project_id)
+        if db_project is None:
+            raise NotFoundException('Project not found')
+        if db_project.owner_id != current_user.id:
+            raise ForbiddenException('Forbidden to update this project')
+        raise PreconditionFailedException('Project was modified', headers={'ETag': version_etag(db_project.version)})
+    activity.record(current_user.id, 'project.updated', project_id, changes=project.model_dump(mode='json', exclude_unset=True))
+    response.headers['ETag'] = version_etag(db_project.version)
+    return db_project
     
-@app.delete('/projects/{project_id}', status_code=status.HTTP_204_NO_CONTENT)
+@router.delete('/projects/{project_id}', status_code=status.HTTP_204_NO_CONTENT)
 def delete_project(
     project_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: schemas.UserResponse = Depends(auth.get_current_user)
 ):
@@ -102,139 +249,605 @@ def delete_project(
         raise NotFoundException('Project not found')
     if db_project.owner_id != current_user.id:
         raise ForbiddenException('Forbidden to delete this project')
+    # Hidden immediately; tasks are removed in batches after the response
     crud.delete_project(db=db, project_id=project_id)
+    activity.record(current_user.id, 'project.deleted', project_id)
+    background_tasks.add_task(jobs.purge_project, project_id)
+
+# Project sharing
+def require_project_owner(db: Session, current_access: dict, project_id: int, forbidden: str):
+    if not access.can(current_access, project_id, access.OWNER):
+        if crud.get_project_owner_id(db, project_id) is None:
+            raise NotFoundException('Project not found')
+        raise ForbiddenException(forbidden)
+
+@router.get('/projects/{project_id}/members', response_model=List[schemas.ProjectMemberResponse])
+def get_project_members(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_access: dict = Depends(get_current_access)
+):
+    if not access.can(current_access, project_id):
+        raise ForbiddenException('Forbidden to access this project')
+    return crud.get_members(db, project_id)
+
+@router.put('/projects/{project_id}/members/{user_id}', response_model=schemas.ProjectMemberResponse)
+def set_project_member(
+    project_id: int,
+    user_id: int,
+    member: schemas.ProjectMemberUpdate,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
+):
+    """Share a project with a user, or change their role"""
+    require_project_owner(db, current_access, project_id, 'Only the owner can share this project')
+    if user_id == current_user.id:
+        raise BadRequestException('The owner cannot be a member')
+    if crud.get_user_by_id(db, user_id) is None:
+        raise NotFoundException('User not found')
+    if database.shard_for_id(user_id) != database.shard_for_id(project_id):
+        # A user's access set is read from their own shard
+        raise BadRequestException('Projects can only be shared with users on the same shard')
+    db_member = crud.set_member(db, project_id, user_id, member.role.value)
+    activity.record(current_user.id, 'member.set', project_id, changes={'user_id': user_id, 'role': member.role.value})
+    return db_member
+
+@router.delete('/projects/{project_id}/members/{user_id}', status_code=status.HTTP_204_NO_CONTENT)
+def remove_project_member(
+    project_id: int,
+    user_id: int,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
+):
+    """Unshare a project; members can also remove themselves"""
+    if user_id != current_user.id:
+        require_project_owner(db, current_access, project_id, 'Only the owner can unshare this project')
+    if not crud.remove_member(db, project_id, user_id):
+        raise NotFoundException('Member not found')
+    activity.record(current_user.id, 'member.removed', project_id, changes={'user_id': user_id})
+
+MAX_ACTIVITY_PAGE = 200
+
+def encode_activity_cursor(entry) -> str:
+    raw = f'{entry.created_at.isoformat()}|{entry.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_activity_cursor(cursor: str):
+    try:
+        created_at, activity_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(activity_id)
+    except ValueError:
+        raise BadRequestException('Invalid cursor')
+
+@router.get('/projects/{project_id}/activity', response_model=schemas.ActivityPage)
+def get_project_activity(
+    project_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_access: dict = Depends(get_current_access)
+):
+    """Who changed what in a project, newest first. Entries appear once the
+    activity writer has flushed them, about a second after the change"""
+    if not access.can(current_access, project_id):
+        raise ForbiddenException('Forbidden to access this project')
+    limit = max(1, min(limit, MAX_ACTIVITY_PAGE))
+    before = decode_activity_cursor(cursor) if cursor else None
+    entries = crud.get_activity(db, project_id, before=before, limit=limit + 1)
+    next_cursor = encode_activity_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return {'items': entries[:limit], 'next_cursor': next_cursor}
+
+@router.get('/projects/{project_id}/events')
+async def project_events(project_id: int, token: str = Depends(auth.oauth2_scheme)):
+    """Server-Sent Events stream of task changes in a project"""
+    def authorize():
+        # Own short-lived session: a get_db session would stay checked out
+        # for as long as the stream is open
+        db = database.pin_shard(SessionLocal(), database.shard_for_id(project_id))
+        try:
+            current_user = auth.get_current_user(token=token, db=db)
+            project = crud.get_project(db, project_id)
+            if project is None:
+                raise NotFoundException('Project not found')
+            if not access.can(access.get_access(db, current_user.id), project_id):
+                raise ForbiddenException('Forbidden to access this project')
+        finally:
+            db.close()
+
+    await run_in_threadpool(authorize)
+    events.start_listener()
+    subscription = events.broker.subscribe(project_id)
+
+    async def stream():
+        try:
+            async for event in subscription.stream():
+                yield events.format_sse(event)
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 # Task endpoints
-@app.post('/tasks/', response_model=schemas.TaskResponse, status_code=status.HTTP_201_CREATED)
+def check_task_access(db: Session, current_access: dict, task, role: str, forbidden: str):
+    """Raise unless the user has `role` on the task's project. Allowed requests
+    cost a dict lookup; only refusals query, to tell a deleted project (404) apart"""
+    if access.can(current_access, task.project_id, role):
+        return
+    if crud.get_project_owner_id(db, task.project_id) is None:
+        raise NotFoundException('Task not found')
+    raise ForbiddenException(forbidden)
+
+def parse_expand(expand: Optional[str] = None):
+    """Parse ?expand=project,assignee into relationship names to eager-load"""
+    if not expand:
+        return ()
+    names = tuple(dict.fromkeys(name.strip() for name in expand.split(',') if name.strip()))
+    unknown = [name for name in names if name not in crud.TASK_EXPAND_OPTIONS]
+    if unknown:
+        raise BadRequestException(f'Cannot expand: {", ".join(unknown)}')
+    return names
+
+@router.post('/tasks/', response_model=schemas.TaskResponse, status_code=status.HTTP_201_CREATED)
 def create_task(
     task: schemas.TaskCreate,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
 ):
-    # Verify user owns the project
-    project = crud.get_project(db, task.project_id)
-    if not project or project.owner_id != current_user.id:
+    if not access.can(current_access, task.project_id, 'editor'):
         raise ForbiddenException('Not authorized to add tasks to this project')
-    return crud.create_task(db=db, task=task, created_by=current_user.id)
+    db_task = crud.create_task(db=db, task=task, created_by=current_user.id)
+    activity.record(current_user.id, 'task.created', db_task.project_id, db_task.id, changes=task.model_dump(mode='json', exclude_unset=True))
+    return db_task
 
-@app.get('/tasks/project/{project_id}', response_model=List[schemas.TaskResponse])
+@router.get('/tasks/batch', response_model=schemas.TaskBatchResponse)
+def get_tasks_by_ids(
+    ids: list = Depends(parse_ids),
+    db: Session = Depends(get_db),
+    current_access: dict = Depends(get_current_access)
+):
+    found = {task.id: task for task, owner_id in crud.get_tasks_by_ids(db, ids)}
+    batch = {'items': [], 'missing': [], 'forbidden': []}
+    for task_id in ids:
+        task = found.get(task_id)
+        if task is None:
+            batch['missing'].append(task_id)
+        elif not access.can(current_access, task.project_id):
+            batch['forbidden'].append(task_id)
+        else:
+            batch['items'].append(task)
+    return batch
+
+@router.patch('/tasks/batch', response_model=schemas.TaskBatchUpdateResponse)
+def update_tasks_batch(
+    batch: schemas.TaskBatchUpdate,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
+):
+    """Apply several task updates (e.g. a drag-and-drop move) in one transaction"""
+    if len(batch.updates) > MAX_BATCH_IDS:
+        raise BadRequestException(f'At most {MAX_BATCH_IDS} updates per request')
+    result = {'items': [], 'missing': [], 'forbidden': [], 'conflicts': []}
+    failed = []
+    changes = []
+    editable = access.project_ids(current_access, 'editor')
+    for item in batch.updates:
+        values = item.model_dump(exclude_unset=True, exclude={'id', 'version'})
+        task = crud.apply_task_update(db, item.id, values, editable, version=item.version)
+        if task is None:
+            failed.append(item.id)
+        else:
+            result['items'].append(task)
+            changes.append((task, item.model_dump(mode='json', exclude_unset=True, exclude={'id', 'version'})))
+    db.commit()
+    for task, values in changes:
+        activity.record(current_user.id, 'task.updated', task.project_id, task.id, changes=values)
+
+    if failed:
+        found = {task.id: task.project_id for task, owner_id in crud.get_tasks_by_ids(db, failed)}
+        for task_id in failed:
+            if task_id not in found:
+                result['missing'].append(task_id)
+            elif not access.can(current_access, found[task_id], 'editor'):
+                result['forbidden'].append(task_id)
+            else:
+                result['conflicts'].append(task_id)
+    return result
+
+@router.get('/tasks/project/{project_id}', response_model=List[schemas.TaskExpandedResponse], response_model_exclude_unset=True)
 def get_project_tasks(
     project_id: int,
     status: Optional[str] = None,
     priority: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
+    include_archived: bool = False,
+    expand: tuple = Depends(parse_expand),
+    fields: Optional[tuple] = Depends(parse_fields(schemas.TaskResponse)),
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_access: dict = Depends(get_current_access)
 ):
-    # Verify user owns the project
-    project = crud.get_project(db, project_id)
-    if not project or project.owner_id != current_user.id:
+    if fields and expand:
+        raise BadRequestException('fields cannot be combined with expand')
+    if not access.can(current_access, project_id):
         raise ForbiddenException('Forbidden to view this project')
-    query = db.query(models.Task).filter(models.Task.project_id == project_id)
+
+    if include_archived:
+        if expand:
+            raise BadRequestException('expand is not supported with include_archived')
+        def where(table):
+            criteria = [table.c.project_id == project_id]
+            if status:
+                criteria.append(table.c.status == status)
+            if priority:
+                criteria.append(table.c.priority == priority)
+            return criteria
+        if fields:
+            return sparse_response(schemas.TaskResponse, fields, crud.get_tasks_all_tiers(db, where, skip=skip, limit=limit, columns=fields))
+        return crud.get_tasks_all_tiers(db, where, skip=skip, limit=limit)
+
+    query = db.query(models.Task).options(*crud.task_load_options(expand)).filter(models.Task.project_id == project_id)
 
     if status:
         query = query.filter(models.Task.status == status)
     if priority:
         query = query.filter(models.Task.priority == priority)
 
+    if fields:
+        query = query.options(load_only(*(getattr(models.Task, name) for name in fields)))
+        return sparse_response(schemas.TaskResponse, fields, query.offset(skip).limit(limit).all())
     return query.offset(skip).limit(limit).all()
 
-@app.get('/tasks/project/{project_id}/stats')
+EXPORT_BATCH_SIZE = 1000
+
+@router.get('/tasks/project/{project_id}/export')
+def export_project_tasks(
+    project_id: int,
+    request: Request,
+    current_access: dict = Depends(get_current_access)
+):
+    """All tasks of a project as CSV, streamed in batches"""
+    if not access.can(current_access, project_id):
+        raise ForbiddenException('Forbidden to view this project')
+    deadline = database.request_deadline(request)
+
+    def rows():
+        # Own session: the get_db session is closed once the response starts
+        export_db = database.pin_shard(SessionLocal(), database.shard_for_id(project_id))
+        database.apply_deadline(export_db, deadline)
+        try:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(crud.TASK_COLUMNS)
+            columns = [models.Task.__table__.c[name] for name in crud.TASK_COLUMNS]
+            result = export_db.execute(
+                select(*columns).where(models.Task.project_id == project_id).order_by(models.Task.id)
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            for batch in result.partitions():
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            export_db.close()
+
+    return StreamingResponse(
+        rows(),
+        media_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="project-{project_id}-tasks.csv"'}
+    )
+
+@router.get('/tasks/project/{project_id}/stats')
 def get_project_stats(
     project_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_access: dict = Depends(get_current_access)
 ):
-    
-    # Verify user owns the project
-    project = crud.get_project(db, project_id)
-    if not project or project.owner_id != current_user.id:
+    if not access.can(current_access, project_id):
         raise ForbiddenException('Forbidden to view this project')
-    
-    tasks = db.query(models.Task).filter(models.Task.project_id == project_id).all()
-
-    stats = {
-        'total_tasks': len(tasks),
-        'todo': len([t for t in tasks if t.status == 'todo']),
-        'in_progress': len([t for t in tasks if t.status == 'in_progress']),
-        'done': len([t for t in tasks if t.status == 'done']),
-        'high_priority': len([t for t in tasks if t.priority == 'high']),
-        'medium_priority': len([t for t in tasks if t.priority == 'medium']),
-        'low_priority': len([t for t in tasks if t.priority == 'low']),
-        'unassigned': len([t for t in tasks if t.assigned_to is None])
-    }
 
-    return stats
+    return crud.get_project_stats(db, project_id)
 
-@app.get('/tasks/my-tasks', response_model=List[schemas.TaskResponse])
+@router.get('/tasks/my-tasks', response_model=List[schemas.TaskExpandedResponse], response_model_exclude_unset=True)
 def get_my_tasks(
     status: Optional[str] = None,
     priority: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
+    include_archived: bool = False,
+    expand: tuple = Depends(parse_expand),
+    fields: Optional[tuple] = Depends(parse_fields(schemas.TaskResponse)),
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
 ):
-    query = db.query(models.Task).filter(models.Task.assigned_to == current_user.id)
+    """Tasks assigned to the user in projects they can access"""
+    if fields and expand:
+        raise BadRequestException('fields cannot be combined with expand')
+    # The access set only holds live projects, so no join to projects is needed
+    project_ids = list(current_access)
+    if include_archived:
+        if expand:
+            raise BadRequestException('expand is not supported with include_archived')
+        def where(table):
+            criteria = [table.c.assigned_to == current_user.id, crud.any_of(db, table.c.project_id, project_ids)]
+            if status:
+                criteria.append(table.c.status == status)
+            if priority:
+                criteria.append(table.c.priority == priority)
+            return criteria
+        if fields:
+            return sparse_response(schemas.TaskResponse, fields, crud.get_tasks_all_tiers(db, where, skip=skip, limit=limit, columns=fields, all_shards=True))
+        return crud.get_tasks_all_tiers(db, where, skip=skip, limit=limit, all_shards=True)
+
+    query = db.query(models.Task).options(*crud.task_load_options(expand)).filter(
+        models.Task.assigned_to == current_user.id,
+        crud.any_of(db, models.Task.project_id, project_ids)
+    )
     
     if status:
         query = query.filter(models.Task.status == status)
     if priority:
         query = query.filter(models.Task.priority == priority)
 
-    return query.offset(skip).limit(limit).all()
+    # Assigned tasks can belong to other owners, i.e. live on other shards
+    if fields:
+        query = query.options(load_only(*(getattr(models.Task, name) for name in fields)))
+        return sparse_response(schemas.TaskResponse, fields, crud.scatter_page(db, query, skip, limit, key=models.Task.id))
+    return crud.scatter_page(db, query, skip, limit, key=models.Task.id)
 
-@app.get('/tasks/{task_id}', response_model=schemas.TaskResponse)
+@router.get('/tasks/{task_id}', response_model=schemas.TaskExpandedResponse, response_model_exclude_unset=True)
 def get_task(
     task_id: int,
+    response: Response,
+    expand: tuple = Depends(parse_expand),
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_access: dict = Depends(get_current_access)
 ):
-    task = crud.get_task(db, task_id)
+    task = crud.get_task(db, task_id, expand=expand)
     if not task:
         raise NotFoundException('Task not found')
-    # Verify user owns the project
-    project = crud.get_project(db, task.project_id)
-    if project.owner_id != current_user.id:
-        raise ForbiddenException('Forbidden to view this task')
+    check_task_access(db, current_access, task, 'viewer', 'Forbidden to view this task')
+    if not expand:
+        # Expanded objects change without bumping the task version
+        response.headers['ETag'] = version_etag(task.version)
     return task
 
-@app.put('/tasks/{task_id}', response_model=schemas.TaskResponse)
+@router.put('/tasks/{task_id}', response_model=schemas.TaskResponse)
 def update_task(
     task_id: int,
     task: schemas.TaskUpdate,
+    request: Request,
+    response: Response,
+    version: Optional[int] = Depends(parse_if_match),
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
 ):
-    db_task = crud.get_task(db, task_id)
-    if not db_task:
-        raise NotFoundException('Task not found')
-    # Verify user owns the project
-    project = crud.get_project(db, db_task.project_id)
-    if project.owner_id != current_user.id:
-        raise ForbiddenException('Forbidden to update this task')
-    return crud.update_task(db=db, task_id=task_id, task=task)
+    write_coalescer = request.app.state.coalescer
+    if write_coalescer is not None and version is None:
+        # Answered once the group commit containing this write has finished;
+        # the request's connection goes back to the pool while it waits
+        db.close()
+        db_task = write_coalescer.submit(task_id, current_user.id, task.model_dump(exclude_unset=True)).result()
+    else:
+        db_task = crud.update_task(
+            db=db, task_id=task_id, task=task, project_ids=access.project_ids(current_access, 'editor'), version=version
+        )
+    if db_task is None:
+        # Only failed updates pay for more queries, to pick the right error
+        db_task = crud.get_task(db, task_id)
+        if db_task is None:
+            raise NotFoundException('Task not found')
+        check_task_access(db, current_access, db_task, 'editor', 'Forbidden to update this task')
+        raise PreconditionFailedException('Task was modified', headers={'ETag': version_etag(db_task.version)})
+    activity.record(current_user.id, 'task.updated', db_task.project_id, task_id, changes=task.model_dump(mode='json', exclude_unset=True))
+    response.headers['ETag'] = version_etag(db_task.version)
+    return db_task
 
-@app.delete('/tasks/{task_id}', status_code=status.HTTP_204_NO_CONTENT)
+@router.delete('/tasks/{task_id}', status_code=status.HTTP_204_NO_CONTENT)
 def delete_task(
     task_id: int,
     db: Session = Depends(get_db),
-    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+    current_user: schemas.UserResponse = Depends(auth.get_current_user),
+    current_access: dict = Depends(get_current_access)
 ):
     db_task = crud.get_task(db, task_id)
     if not db_task:
         raise NotFoundException('Task not found')
-    # Verify user owns the project
-    project = crud.get_project(db, db_task.project_id)
-    if project.owner_id != current_user.id:
-        raise ForbiddenException('Not authorized to delete this task')
+    check_task_access(db, current_access, db_task, 'editor', 'Not authorized to delete this task')
+    project_id = db_task.project_id
     crud.delete_task(db=db, task_id=task_id)
+    activity.record(current_user.id, 'task.deleted', project_id, task_id)
+
+# Delta sync
+def sync_token_signature(raw: str) -> str:
+    """HMAC of a token's contents, so clients cannot move its cursor or issue time"""
+    return hmac.new(get_settings().secret_key.encode(), raw.encode(), hashlib.sha256).hexdigest()
+
+def encode_sync_token(cursor):
+    raw = '.'.join(str(part) for part in (*cursor, int(time.time())))
+    return base64.urlsafe_b64encode(f'{raw}.{sync_token_signature(raw)}'.encode()).decode()
+
+def decode_sync_token(token: str):
+    """Return the (change_seq, kind, id) cursor of a token from encode_sync_token"""
+    try:
+        raw, _, signature = base64.urlsafe_b64decode(token.encode()).decode().rpartition('.')
+        *cursor, issued_at = (int(part) for part in raw.split('.'))
+    except ValueError:
+        raise BadRequestException('Invalid sync token')
+    if len(cursor) != 3 or not hmac.compare_digest(signature, sync_token_signature(raw)):
+        raise BadRequestException('Invalid sync token')
+    if time.time() - issued_at > jobs.TOMBSTONE_RETENTION.total_seconds():
+        raise GoneException('Sync token expired, do a full sync')
+    return tuple(cursor)
+
+@router.get('/sync', response_model=schemas.SyncResponse)
+def sync(
+    since: Optional[str] = None,
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: schemas.UserResponse = Depends(auth.get_current_user)
+):
+    """Tasks changed and deleted in the user's projects since the `since` token"""
+    after = decode_sync_token(since) if since else crud.SYNC_START
+    rows, has_more = crud.get_changes(db, owner_id=current_user.id, after=after, limit=max(1, min(limit, 1000)))
 
-@app.get('/health')
+    tasks = [dict(row._mapping, id=row.task_id) for row in rows if row.kind == 0]
+    deleted = [row._mapping for row in rows if row.kind == 1]
+    if rows:
+        after = (rows[-1].change_seq, rows[-1].kind, rows[-1].key)
+    return {
+        'tasks': tasks,
+        'deleted': deleted,
+        'next_token': encode_sync_token(after),
+        'has_more': has_more
+    }
+
+@router.get('/health')
 def health_check():
     return {
         'status': 'healthy',
         'service': 'Task Management API',
         'version': '1.0.0'
     }
+
+@router.get('/health/ready')
+def readiness_check(request: Request):
+    """200 once the startup warm-up has finished"""
+    if not request.app.state.ready:
+        raise ServiceUnavailableException('Starting up')
+    return {'status': 'ready'}
+
+@router.get('/admin/profile', response_class=PlainTextResponse)
+async def sample_profile(
+    seconds: float = 10,
+    interval_ms: float = 5,
+    admin: schemas.UserResponse = Depends(auth.get_current_admin)
+):
+    """Sample every thread of this worker for `seconds`; collapsed stacks for a flame graph"""
+    if not 0 < seconds <= profiling.MAX_SAMPLE_SECONDS:
+        raise BadRequestException(f'seconds must be between 0 and {profiling.MAX_SAMPLE_SECONDS}')
+    if interval_ms < 1:
+        raise BadRequestException('interval_ms must be at least 1')
+    stacks = await run_in_threadpool(profiling.sample, seconds, interval_ms / 1000)
+    if stacks is None:
+        raise ConflictException('A profile is already being captured')
+    return stacks
+
+@router.get('/admin/metrics')
+def get_metrics(request: Request, admin: schemas.UserResponse = Depends(auth.get_current_admin)):
+    """Counters of this worker's background writers"""
+    write_coalescer = request.app.state.coalescer
+    return {
+        'activity': activity.metrics(),
+        'coalescer': write_coalescer and {
+            'writes': write_coalescer.writes,
+            'updates': write_coalescer.updates,
+            'commits': write_coalescer.commits,
+        },
+    }
+
+async def retry_warm_up(app: FastAPI):
+    """Repeat the warm-up until the database answers, then report ready"""
+    while True:
+        await asyncio.sleep(startup.RETRY_SECONDS)
+        if await run_in_threadpool(startup.warm_up, app, app.state.settings):
+            break
+    events.start_listener()
+    app.state.ready = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmed_up = await run_in_threadpool(startup.warm_up, app, app.state.settings)
+    settings = app.state.settings
+    if settings.write_coalesce_ms > 0:
+        app.state.coalescer = coalescer.WriteCoalescer(settings.write_coalesce_ms / 1000).start()
+    activity.start(settings.activity_queue_size, settings.activity_batch_size, settings.activity_flush_ms / 1000)
+    # Delivers access invalidations from other workers (PostgreSQL only)
+    events.start_listener()
+    retrying = None
+    if warmed_up:
+        app.state.ready = True
+    else:
+        # Serve, with /health/ready answering 503, until the pool can be opened
+        retrying = asyncio.create_task(retry_warm_up(app))
+    scheduler = reminders.start_in_app(settings)
+    yield
+    if retrying is not None:
+        retrying.cancel()
+    app.state.ready = False
+    if app.state.coalescer is not None:
+        app.state.coalescer.stop()
+        app.state.coalescer = None
+    # Writes out the queued entries
+    activity.stop()
+    if scheduler is not None:
+        scheduler.stop()
+    events.stop_listener()
+
+QUERY_CANCELED = '57014' # PostgreSQL error code of a statement_timeout
+
+async def statement_timeout_handler(request: Request, exc: OperationalError):
+    """A statement cancelled by the request deadline is a 503, not a crash"""
+    if getattr(exc.orig, 'pgcode', None) == QUERY_CANCELED:
+        return JSONResponse({'detail': 'Request deadline exceeded'}, status_code=503, headers={'Retry-After': '1'})
+    raise exc
+
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    """No pool connection within the queue budget: the database is saturated"""
+    return JSONResponse({'detail': 'Server busy'}, status_code=503, headers={'Retry-After': '1'})
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build the application and its database engines; without `settings`
+    they are read from the environment"""
+    if settings is None:
+        settings = get_settings()
+    use_settings(settings)
+    if database.configured_settings != settings:
+        database.configure(settings)
+
+    app = FastAPI(title='Task Management API', version='1.0.0', lifespan=lifespan)
+    app.state.settings = settings
+    app.state.ready = False
+    app.state.coalescer = None
+    app.add_middleware(compression.CompressionMiddleware, **compression.from_settings(settings))
+    app.add_middleware(admission.AdmissionMiddleware, **admission.from_settings(settings))
+    app.add_middleware(ratelimit.RateLimitMiddleware, **ratelimit.from_settings(settings))
+    if settings.profile_requests:
+        # Outermost, so the profile covers the other middlewares too
+        app.add_middleware(profiling.ProfileMiddleware)
+    app.include_router(router)
+    app.add_exception_handler(OperationalError, statement_timeout_handler)
+    app.add_exception_handler(PoolTimeoutError, pool_timeout_handler)
+    return app
+
+class LazyApp:
+    """ASGI entry point for `uvicorn app.main:app`: calls create_app() on the
+    first event (the lifespan startup under uvicorn), so importing this module
+    reads no settings and opens no engines"""
+    def __init__(self):
+        self._app = None
+
+    def get(self) -> FastAPI:
+        if self._app is None:
+            self._app = create_app()
+        return self._app
+
+    async def __call__(self, scope, receive, send):
+        await self.get()(scope, receive, send)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+app = LazyApp()
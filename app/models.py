@@ -1,7 +1,47 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, Index, JSON, text, event
+from sqlalchemy.sql import func, table, column
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
-from app.database import Base
+from app.database import Base, assign_shard_aware_id
+
+# Without transaction ids to go by, the next value is simply max + 1
+_MAX_CHANGE_SEQ_PLUS_ONE = (
+    '(SELECT coalesce(max(seq), 0) + 1 FROM ('
+    'SELECT max(change_seq) AS seq FROM tasks '
+    'UNION ALL SELECT max(change_seq) FROM task_tombstones) AS change_seqs)'
+)
+
+class next_change_seq(FunctionElement):
+    """Change sequence value for a row being written (see crud.get_changes).
+
+    On PostgreSQL this is the id of the writing transaction, so that
+    change_horizon() can tell which values belong to transactions that may still
+    commit. Elsewhere (tests), writes are serialized and max + 1 is enough.
+    """
+    type = BigInteger()
+    inherit_cache = True
+
+@compiles(next_change_seq)
+def _next_change_seq(element, compiler, **kw):
+    return _MAX_CHANGE_SEQ_PLUS_ONE
+
+@compiles(next_change_seq, 'postgresql')
+def _next_change_seq_postgresql(element, compiler, **kw):
+    return 'pg_current_xact_id()::text::bigint'
+
+class change_horizon(FunctionElement):
+    """Change sequence values below this one can no longer be written by an open transaction"""
+    type = BigInteger()
+    inherit_cache = True
+
+@compiles(change_horizon)
+def _change_horizon(element, compiler, **kw):
+    return _MAX_CHANGE_SEQ_PLUS_ONE
+
+@compiles(change_horizon, 'postgresql')
+def _change_horizon_postgresql(element, compiler, **kw):
+    return 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
 
 class User(Base):
     __tablename__ = 'users'
@@ -15,7 +55,7 @@ class User(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationship
-    projects = relationship('Project', back_populates='owner')
+    projects = relationship('Project', back_populates='owner', lazy='raise')
 
 class Project(Base):
     __tablename__ = 'projects'
@@ -25,12 +65,28 @@ class Project(Base):
     description = Column(Text, nullable=True)
     owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     is_active = Column(Boolean, default=True)
+    deleted_at = Column(DateTime(timezone=True), nullable=True) # set on delete, row purged in background
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    version = Column(Integer, nullable=False, server_default='1') # bumped on every update, sent as the ETag
+
+    __mapper_args__ = {'version_id_col': version}
 
     # Relationship
-    owner = relationship('User', back_populates='projects')
-    tasks = relationship('Task', back_populates='project')
+    owner = relationship('User', back_populates='projects', lazy='raise')
+    # Tasks are removed by the database (ON DELETE CASCADE) or by jobs.purge_project,
+    # never loaded into the session just to be deleted
+    tasks = relationship('Task', back_populates='project', lazy='raise', passive_deletes=True)
+
+class ProjectMember(Base):
+    """A user the project is shared with; the owner is implicit (projects.owner_id).
+    Rows live on the project's shard, so members must share the owner's shard."""
+    __tablename__ = 'project_members'
+
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, index=True)
+    role = Column(String, nullable=False, default='viewer') # viewer, editor
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Task(Base):
     __tablename__ = 'tasks'
@@ -40,14 +96,116 @@ class Task(Base):
     description = Column(Text, nullable=True)
     status = Column(String, default='todo') # todo, in_progress, done
     priority = Column(String, default='medium') # low, medium, high
-    project_id = Column(Integer, ForeignKey('projects.id'), nullable=False)
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), nullable=False, index=True)
     assigned_to = Column(Integer, ForeignKey('users.id'), nullable=True)
     created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
     due_date = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Bumped on every write; Core UPDATEs must set it explicitly
+    change_seq = Column(BigInteger, nullable=False, default=next_change_seq(), onupdate=next_change_seq(), server_default='0')
+    version = Column(Integer, nullable=False, server_default='1') # bumped on every update, sent as the ETag
+
+    __table_args__ = (
+        Index('ix_tasks_project_id_change_seq', 'project_id', 'change_seq'),
+        # Reminder scans only ever look at open tasks: new due dates by
+        # due_date, tasks changed since the last scan by change_seq
+        Index('ix_tasks_due_date_open', 'due_date',
+              postgresql_where=text("status <> 'done'"), sqlite_where=text("status <> 'done'")),
+        Index('ix_tasks_change_seq_open', 'change_seq',
+              postgresql_where=text("status <> 'done'"), sqlite_where=text("status <> 'done'")),
+    )
+
+    # project_id is part of the ORM identity so that the UPDATE/DELETE statements
+    # emitted on flush carry the partition key and touch a single partition
+    # when tasks is hash-partitioned by project_id (see the partitioning migration).
+    # id stays unique there through the trigger-maintained task_ids table
+    # version_id_col: ORM flushes check and bump version like crud.update_task does
+    __mapper_args__ = {'primary_key': [id, project_id], 'version_id_col': version}
+
+    # Relationships (lazy='raise': load them explicitly, see crud.task_load_options)
+    project = relationship('Project', back_populates='tasks', lazy='raise')
+    assignee = relationship('User', foreign_keys=[assigned_to], lazy='raise')
+    creator = relationship('User', foreign_keys=[created_by], lazy='raise')
+
+class TaskArchive(Base):
+    """Cold tier for old done tasks, moved out of `tasks` by jobs.archive_done_tasks"""
+    __tablename__ = 'tasks_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False) # keeps the original task id
+    title = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    status = Column(String)
+    priority = Column(String)
+    project_id = Column(Integer, ForeignKey('projects.id', ondelete='CASCADE'), nullable=False, index=True)
+    assigned_to = Column(Integer, ForeignKey('users.id'), nullable=True)
+    created_by = Column(Integer, ForeignKey('users.id'), nullable=False)
+    due_date = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    change_seq = Column(BigInteger, nullable=False, server_default='0')
+    version = Column(Integer, nullable=False, server_default='1')
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class TaskTombstone(Base):
+    """Records deleted tasks (task_id set) and projects (task_id NULL) for delta sync"""
+    __tablename__ = 'task_tombstones'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=True)
+    project_id = Column(Integer, nullable=False)
+    # Denormalized: the project row is gone once a deleted project is purged
+    owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    change_seq = Column(BigInteger, nullable=False, default=next_change_seq())
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (Index('ix_task_tombstones_owner_id_change_seq', 'owner_id', 'change_seq'),)
+
+class ActivityLog(Base):
+    """Who changed what, written in batches by app.activity. No foreign keys:
+    history outlives users and purged projects, and a late batch never fails on them"""
+    __tablename__ = 'activity_log'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True)
+    project_id = Column(Integer, nullable=False)
+    task_id = Column(Integer, nullable=True)
+    user_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False) # task.updated, project.deleted, ...
+    changes = Column(JSON, nullable=True) # the fields that were set
+    created_at = Column(DateTime(timezone=True), nullable=False) # when it happened, not when it was flushed
+
+    __table_args__ = (Index('ix_activity_log_project_id_created_at', 'project_id', 'created_at'),)
+
+class ReminderMark(Base):
+    """High-water marks of the reminder scan, one row per reminder kind and shard"""
+    __tablename__ = 'reminder_marks'
+
+    kind = Column(String, primary_key=True) # due_soon, overdue
+    shard = Column(Integer, primary_key=True)
+    due_mark = Column(DateTime(timezone=True), nullable=False) # due dates up to here are done
+    seq_mark = Column(BigInteger, nullable=False) # change_seq horizon of the last scan
+
+class TaskReminder(Base):
+    """Reminders already sent, so a task is reminded once per kind and due date"""
+    __tablename__ = 'task_reminders'
+
+    task_id = Column(Integer, primary_key=True)
+    kind = Column(String, primary_key=True)
+    due_date = Column(DateTime(timezone=True), primary_key=True)
+
+# Ids route rows to their shard when sharded (see app.database)
+for model in (User, Project, Task):
+    event.listen(model, 'before_insert', assign_shard_aware_id)
 
-    # Relationships
-    project = relationship('Project', back_populates='tasks')
-    assignee = relationship('User', foreign_keys=[assigned_to])
-    creator = relationship('User', foreign_keys=[created_by])
+# Materialized view of per-project task counters (PostgreSQL only, created by
+# migration and refreshed by `python -m app.jobs refresh-stats`). Not part of
+# Base.metadata, so create_all leaves it alone.
+project_task_stats = table(
+    'project_task_stats',
+    column('project_id', Integer),
+    *(column(name, Integer) for name in (
+        'total_tasks', 'todo', 'in_progress', 'done', 'high_priority',
+        'medium_priority', 'low_priority', 'unassigned', 'overdue'
+    )),
+    column('refreshed_at', DateTime(timezone=True))
+)
@@ -0,0 +1,154 @@
+"""Production profiling, stdlib only.
+
+sample() watches every thread of the worker for a number of seconds, reading
+their stacks from sys._current_frames() at a fixed interval, and returns the
+stacks in collapsed format ("thread;outer;...;inner count" per line). Feed that
+to flamegraph.pl or speedscope to get a flame graph.
+
+With PROFILE_REQUESTS=true, an admin can send `X-Profile: cumulative` (or any
+pstats sort key) with a request to get a cProfile summary of that request back
+instead of its response. The profiler watches the whole event-loop thread (and
+from Python 3.12 every thread), so only one request is profiled at a time;
+another X-Profile request meanwhile gets a 409. Other requests the worker
+serves during the profile still show up in it. Before 3.12 sync endpoints get
+a profiler of their own in the threadpool (ProfiledRoute). When
+PROFILE_REQUESTS is off, ProfileMiddleware is not installed at all; the only
+trace left is one context variable lookup per sync endpoint call, before 3.12.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from app.config import JWT_ALGORITHM, get_settings
+
+MAX_SAMPLE_SECONDS = 60
+
+_sampling = threading.Lock()
+_profiling = threading.Lock()
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+
+def collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+def sample(seconds: float, interval: float = 0.005) -> Optional[str]:
+    """Collapsed stacks of all other threads over `seconds`; None if a sample is already running"""
+    if not _sampling.acquire(blocking=False):
+        return None
+    try:
+        me = threading.get_ident()
+        stacks = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    stacks[f'{names.get(ident, ident)};{collapse(frame)}'] += 1
+            time.sleep(interval)
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+    finally:
+        _sampling.release()
+
+def is_admin(email: Optional[str]) -> bool:
+    return email is not None and email.lower() in get_settings().admin_emails
+
+# Per-request profiling. Before 3.12 a cProfile profiler only sees the thread
+# that enabled it; from 3.12 it runs on sys.monitoring, covers every thread, and
+# only one can be active in the interpreter.
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+_request_profiles: ContextVar[Optional[list]] = ContextVar('request_profiles', default=None)
+
+def profiled(endpoint):
+    """Sync endpoints run in the threadpool, out of reach of the middleware's
+    profiler before 3.12; profile them in their own thread when the request
+    asked for it"""
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profiles = _request_profiles.get()
+        if profiles is None:
+            return endpoint(*args, **kwargs)
+        profile = cProfile.Profile()
+        profiles.append(profile)
+        return profile.runcall(endpoint, *args, **kwargs)
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        if PER_THREAD_PROFILERS and not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+def token_email(scope) -> Optional[str]:
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() != 'bearer':
+                return None
+            try:
+                return jwt.decode(token, get_settings().secret_key, algorithms=[JWT_ALGORITHM]).get('sub')
+            except JWTError:
+                return None
+    return None
+
+class ProfileMiddleware:
+    """Answer admin requests carrying X-Profile with their cProfile summary"""
+    def __init__(self, app, limit: int = 40):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        sort = next((value.decode('latin-1') for name, value in scope['headers'] if name == b'x-profile'), None)
+        if sort is None or not is_admin(token_email(scope)):
+            return await self.app(scope, receive, send)
+        if sort not in pstats.Stats.sort_arg_dict_default:
+            sort = 'cumulative'
+        # One profiler per thread: a second one would replace it (3.11) or fail to enable (3.12+)
+        if not _profiling.acquire(blocking=False):
+            response = JSONResponse({'detail': 'A profile is already being captured'}, status_code=409)
+            return await response(scope, receive, send)
+
+        status = None
+        async def capture(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        profiles = [cProfile.Profile()]
+        token = _request_profiles.set(profiles)
+        started = time.perf_counter()
+        try:
+            profiles[0].enable()
+            await self.app(scope, receive, capture)
+        finally:
+            profiles[0].disable()
+            _request_profiles.reset(token)
+            _profiling.release()
+        elapsed = time.perf_counter() - started
+
+        out = io.StringIO()
+        pstats.Stats(*profiles, stream=out).sort_stats(sort).print_stats(self.limit)
+        response = PlainTextResponse(out.getvalue(), headers={
+            'X-Profile-Status': str(status),
+            'X-Profile-Seconds': f'{elapsed:.6f}',
+        })
+        await response(scope, receive, send)
@@ -0,0 +1,115 @@
+"""Bulk user provisioning from CSV (POST /users/bulk, `python -m app.jobs provision-users`).
+
+The CSV needs email, username and password columns. Rows that fail
+validation, repeat an earlier row, or name an email or username that is
+already taken are skipped and reported by line number; the rest are created.
+
+bcrypt is slow on purpose (about a quarter of a second per hash), so
+passwords are hashed in a pool of worker processes, one per core, rather
+than one at a time in the calling thread. Taken emails and usernames are
+looked up first, so importing the same file again costs no hashing. Users
+are then inserted per shard in multi-row INSERT ... ON CONFLICT DO NOTHING
+batches; a row that loses a race with a concurrent registration is
+reported as skipped.
+"""
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Optional
+
+from pydantic import ValidationError
+
+from app import crud, models, schemas
+from app.database import SessionLocal, pin_shard, shard_for_email
+
+COLUMNS = {'email', 'username', 'password'}
+INSERT_BATCH_SIZE = 1000
+# Below this, starting the worker processes costs more than it saves
+PARALLEL_MIN_PASSWORDS = 16
+
+def read_csv(stream, limit: Optional[int] = None) -> list:
+    """(line number, row) pairs of a CSV file; ValueError when columns are missing or there are over `limit` rows"""
+    reader = csv.DictReader(stream)
+    missing = COLUMNS - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f'CSV is missing columns: {", ".join(sorted(missing))}')
+    rows = []
+    for row in reader:
+        if limit is not None and len(rows) == limit:
+            raise ValueError(f'At most {limit} users per upload')
+        rows.append((reader.line_num, row))
+    return rows
+
+def hash_passwords(passwords: list, workers: Optional[int] = None) -> list:
+    """bcrypt hashes of `passwords`, in order, computed by `workers` processes (default: one per core)"""
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(passwords) < PARALLEL_MIN_PASSWORDS:
+        return [crud.hash_password(password) for password in passwords]
+    # spawn rather than fork: forking a threaded server can copy locks held by other threads
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(crud.hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+def batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def taken(db, column, values: list) -> set:
+    return set().union(*(crud.get_existing_user_values(db, column, batch) for batch in batches(values, INSERT_BATCH_SIZE)))
+
+def provision_users(rows: Iterable, workers: Optional[int] = None) -> dict:
+    """Create users from (line number, row) pairs; returns the number created and the skipped rows"""
+    skipped = []
+    users = []  # (line, UserCreate)
+    emails, usernames = set(), set()
+    for line, row in rows:
+        try:
+            user = schemas.UserCreate(email=row.get('email'), username=row.get('username'), password=row.get('password'))
+        except ValidationError as e:
+            skipped.append({'line': line, 'email': row.get('email'), 'detail': e.errors()[0]['msg']})
+            continue
+        if user.email in emails or user.username in usernames:
+            skipped.append({'line': line, 'email': user.email, 'detail': 'Duplicate of an earlier row'})
+            continue
+        emails.add(user.email)
+        usernames.add(user.username)
+        users.append((line, user))
+
+    db = SessionLocal()
+    try:
+        taken_emails = taken(db, models.User.email, [user.email for _, user in users])
+        taken_usernames = taken(db, models.User.username, [user.username for _, user in users])
+    finally:
+        db.close()
+    new_users = []
+    for line, user in users:
+        if user.email in taken_emails:
+            skipped.append({'line': line, 'email': user.email, 'detail': 'Email already registered'})
+        elif user.username in taken_usernames:
+            skipped.append({'line': line, 'email': user.email, 'detail': 'Username already taken'})
+        else:
+            new_users.append((line, user))
+
+    hashes = hash_passwords([user.password for _, user in new_users], workers)
+    by_shard = {}
+    for (line, user), hashed_password in zip(new_users, hashes):
+        by_shard.setdefault(shard_for_email(user.email), []).append((line, {
+            'email': user.email,
+            'username': user.username,
+            'hashed_password': hashed_password
+        }))
+    created = 0
+    for shard, shard_rows in by_shard.items():
+        db = pin_shard(SessionLocal(), shard)
+        try:
+            for batch in batches(shard_rows, INSERT_BATCH_SIZE):
+                inserted = {user.email for user in crud.insert_users(db, [row for _, row in batch])}
+                created += len(inserted)
+                # Taken since the lookup above
+                skipped.extend(
+                    {'line': line, 'email': row['email'], 'detail': 'Email or username already taken'}
+                    for line, row in batch if row['email'] not in inserted
+                )
+        finally:
+            db.close()
+    return {'created': created, 'skipped': sorted(skipped, key=lambda entry: entry['line'])}
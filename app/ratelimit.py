@@ -0,0 +1,177 @@
+"""Token bucket rate limiting middleware.
+
+Requests are keyed on the user id carried in the bearer token (verified but
+not looked up in the database) or, without a valid token, on the client IP.
+Routes listed in ROUTE_LIMITS get their own bucket per client; everything else
+shares the default bucket.
+
+Configuration (environment, read into Settings):
+  RATE_LIMIT_ENABLED  true/false (default true)
+  RATE_LIMIT_BACKEND  memory (per worker, default) or postgres (shared by all
+                      workers through the rate_limit_buckets table)
+  RATE_LIMITS         JSON overrides, e.g. {"POST /auth/login": "5/60", "default": "300/60"};
+                      a value of null disables limiting for that route
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from jose import JWTError, jwt
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from app import auth
+from app.config import Settings, get_settings
+from app.database import SessionLocal
+
+class RateLimit(NamedTuple):
+    capacity: int  # burst size
+    period: float  # seconds to refill a full bucket
+
+    @property
+    def rate(self):
+        return self.capacity / self.period
+
+    @classmethod
+    def parse(cls, value: str):
+        """'10/60' -> 10 requests per 60 seconds"""
+        capacity, period = value.split('/')
+        return cls(int(capacity), float(period))
+
+DEFAULT_LIMIT = RateLimit(300, 60)
+ROUTE_LIMITS = {
+    'POST /auth/login': RateLimit(10, 60),
+    'POST /users': RateLimit(10, 60),
+    'GET /tasks/my-tasks': RateLimit(60, 60),
+    'GET /health': None,
+    'GET /health/ready': None,
+}
+
+class MemoryBackend:
+    """Buckets in a per-worker LRU dict; each hit is O(1)"""
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, limit: RateLimit):
+        """Take one token; returns (allowed, tokens left)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, tokens
+
+class PostgresBackend:
+    """Buckets in an UNLOGGED table, updated with one atomic upsert per hit"""
+    blocking = True
+
+    REFILL = 'least(CAST(:capacity AS double precision), b.tokens + extract(epoch FROM now() - b.updated_at) * :rate)'
+    HIT = text(f'''
+        INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+        VALUES (:key, :capacity - 1, true, now())
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = {REFILL} - CASE WHEN {REFILL} >= 1 THEN 1 ELSE 0 END,
+            allowed = {REFILL} >= 1,
+            updated_at = now()
+        RETURNING b.allowed, b.tokens
+    ''')
+
+    def hit(self, key: str, limit: RateLimit):
+        db = SessionLocal()
+        try:
+            allowed, tokens = db.execute(self.HIT, {'key': key, 'capacity': limit.capacity, 'rate': limit.rate}).one()
+            db.commit()
+        finally:
+            db.close()
+        return allowed, tokens
+
+class RateLimitMiddleware:
+    def __init__(self, app, backend=None, limits: Optional[dict] = None, default: Optional[RateLimit] = DEFAULT_LIMIT, enabled: bool = True):
+        self.app = app
+        self.backend = backend or MemoryBackend()
+        self.limits = {self.normalize(route): limit for route, limit in (limits if limits is not None else ROUTE_LIMITS).items()}
+        self.default = default
+        self.enabled = enabled
+
+    @staticmethod
+    def normalize(route: str) -> str:
+        return route.rstrip('/') or '/'
+
+    @staticmethod
+    def client_key(scope) -> str:
+        for name, value in scope['headers']:
+            if name == b'authorization':
+                scheme, _, token = value.decode('latin-1').partition(' ')
+                if scheme.lower() == 'bearer':
+                    try:
+                        payload = jwt.decode(token, get_settings().secret_key, algorithms=[auth.ALGORITHM])
+                        return f"user:{payload.get('uid') or payload.get('sub')}"
+                    except JWTError:
+                        pass
+                break
+        client = scope.get('client')
+        return f'ip:{client[0] if client else "unknown"}'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        route = self.normalize(f"{scope['method']} {scope['path']}")
+        limit = self.limits.get(route, self.default)
+        if limit is None:
+            return await self.app(scope, receive, send)
+        key = f"{self.client_key(scope)}|{route if route in self.limits else '*'}"
+
+        if self.backend.blocking:
+            allowed, tokens = await run_in_threadpool(self.backend.hit, key, limit)
+        else:
+            allowed, tokens = self.backend.hit(key, limit)
+
+        headers = {
+            'RateLimit-Limit': str(limit.capacity),
+            'RateLimit-Remaining': str(int(tokens)),
+            'RateLimit-Reset': str(math.ceil((limit.capacity - tokens) / limit.rate)),
+        }
+        if not allowed:
+            headers['Retry-After'] = str(math.ceil((1 - tokens) / limit.rate))
+            response = JSONResponse({'detail': 'Too many requests'}, status_code=429, headers=headers)
+            return await response(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [
+                    (name.lower().encode(), value.encode()) for name, value in headers.items()
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+def from_settings(settings: Settings):
+    """Middleware options from the settings"""
+    limits = dict(ROUTE_LIMITS)
+    default = DEFAULT_LIMIT
+    for route, value in settings.rate_limits:
+        limit = RateLimit.parse(value) if value else None
+        if route == 'default':
+            default = limit
+        else:
+            limits[route] = limit
+    backend = PostgresBackend() if settings.rate_limit_backend == 'postgres' else MemoryBackend()
+    return {
+        'backend': backend,
+        'limits': limits,
+        'default': default,
+        'enabled': settings.rate_limit_enabled,
+    }
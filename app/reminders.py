@@ -0,0 +1,149 @@
+"""Due-date reminders.
+
+Emits 'task.due_soon' when an open task's due date comes within
+UPCOMING_WINDOW, and 'task.overdue' when it passes. The events go out on the
+task change feed (app.events).
+
+Each scan only looks at new candidates. reminder_marks keeps a high-water mark
+per reminder kind and shard:
+  due_mark - due dates up to here have been handled; the next scan covers
+             (due_mark, now + window] through the partial index on open tasks
+  seq_mark - change_seq horizon of the last scan; the next scan reads tasks
+             changed since then through the partial change_seq index, and
+             catches those created or rescheduled into the covered range
+A new mark starts with seq_mark 0, so the first scan also catches tasks that
+were upcoming or overdue before it ran (overdue ones back to REMINDER_RETENTION);
+it is the only scan that reads every open task.
+Tasks are split into SHARDS by id. A worker claims a mark row with
+FOR UPDATE SKIP LOCKED, so several workers share the shards without waiting on
+each other. task_reminders records what was sent, so a task is reminded at most
+once per kind and due date.
+
+Run it as a worker (python -m app.reminders) or inside the API process with
+REMINDER_SCHEDULER=app.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, and_, case, union_all
+from sqlalchemy.orm import Session
+
+from app import models, events, crud
+from app.config import Settings
+from app.database import shard_sessions
+
+logger = logging.getLogger(__name__)
+
+UPCOMING_WINDOW = timedelta(hours=24)
+INTERVAL_SECONDS = 60
+SHARDS = 4
+KINDS = ('due_soon', 'overdue')
+# Sent reminders are kept this long after the due date, then forgotten
+REMINDER_RETENTION = timedelta(days=30)
+
+def scan(db: Session, kind: str, shard: int, now: datetime) -> int:
+    """Fire the reminders of one kind and shard; returns how many were sent"""
+    Task = models.Task
+    upper = now + UPCOMING_WINDOW if kind == 'due_soon' else now
+    horizon = db.scalar(select(models.change_horizon()))
+
+    db.execute(crud.insert_ignoring_conflicts(db, models.ReminderMark).values(
+        kind=kind, shard=shard, due_mark=upper, seq_mark=0
+    ))
+    db.commit()
+    mark = db.scalars(
+        select(models.ReminderMark).where(
+            models.ReminderMark.kind == kind,
+            models.ReminderMark.shard == shard
+        ).with_for_update(skip_locked=True)
+    ).first()
+    if mark is None:
+        db.rollback()  # another worker is scanning this shard
+        return 0
+
+    columns = (Task.id, Task.project_id, Task.due_date)
+    # Due dates past the mark, through ix_tasks_due_date_open
+    newly_due = select(*columns).where(
+        Task.status != 'done',
+        Task.id % SHARDS == shard,
+        Task.due_date > mark.due_mark,
+        Task.due_date <= upper
+    )
+    # Created or rescheduled behind the mark since the last scan. Driven by
+    # ix_tasks_change_seq_open: the CTE is materialized so the planner cannot
+    # read the due_date index over the whole retention window instead.
+    recent = select(*columns).where(
+        Task.status != 'done',
+        Task.id % SHARDS == shard,
+        Task.change_seq >= mark.seq_mark,
+        Task.change_seq < horizon
+    ).cte('recent').prefix_with('MATERIALIZED')
+    if kind == 'due_soon':
+        still_due = recent.c.due_date > now
+    else:
+        still_due = and_(recent.c.due_date <= now, recent.c.due_date > now - REMINDER_RETENTION)
+    changed = select(recent).where(
+        recent.c.due_date <= mark.due_mark,
+        still_due
+    )
+    tasks = db.execute(union_all(newly_due, changed)).all()
+
+    sent = 0
+    if tasks:
+        new = db.scalars(
+            crud.insert_ignoring_conflicts(db, models.TaskReminder).values([
+                {'task_id': task.id, 'kind': kind, 'due_date': task.due_date} for task in tasks
+            ]).returning(models.TaskReminder.task_id)
+        ).all()
+        project_ids = {task.id: task.project_id for task in tasks}
+        for task_id in new:
+            events.emit(db, f'task.{kind}', project_ids[task_id], task_id)
+        sent = len(new)
+
+    mark.due_mark = case((models.ReminderMark.due_mark < upper, upper), else_=models.ReminderMark.due_mark)
+    mark.seq_mark = horizon
+    db.commit()
+    return sent
+
+def run_once(db: Session, now: datetime = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    sent = sum(scan(db, kind, shard, now) for kind in KINDS for shard in range(SHARDS))
+    db.execute(delete(models.TaskReminder).where(models.TaskReminder.due_date < now - REMINDER_RETENTION))
+    db.commit()
+    return sent
+
+class ReminderScheduler(threading.Thread):
+    def __init__(self, interval: float = INTERVAL_SECONDS):
+        super().__init__(name='reminder-scheduler', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            for db in shard_sessions():
+                try:
+                    run_once(db)
+                except Exception:
+                    logger.exception('Reminder scan failed')
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+
+def start_in_app(settings: Settings):
+    """Start the scheduler in this process if REMINDER_SCHEDULER=app"""
+    if settings.reminder_scheduler != 'app':
+        return None
+    scheduler = ReminderScheduler()
+    scheduler.start()
+    return scheduler
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    scheduler = ReminderScheduler()
+    scheduler.start()
+    try:
+        scheduler.join()
+    except KeyboardInterrupt:
+        scheduler.stop()
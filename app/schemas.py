@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr, ConfigDict
+from functools import lru_cache
+from pydantic import BaseModel, EmailStr, ConfigDict, model_validator, create_model, TypeAdapter
+from sqlalchemy import inspect
 from datetime import datetime
-from typing import Optional
-from app.enums import TaskStatus, TaskPriority
+from typing import Optional, List
+from app.enums import TaskStatus, TaskPriority, ProjectRole
 
 # User schemas
 
@@ -29,6 +31,20 @@ class UserResponse(UserBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class UserSearchResult(BaseModel):
+    id: int
+    username: str
+    email: str
+
+class BulkUserSkipped(BaseModel):
+    line: int
+    email: Optional[str] = None
+    detail: str
+
+class BulkUserResult(BaseModel):
+    created: int
+    skipped: List[BulkUserSkipped]
+
 # Token schemas
 class Token(BaseModel):
     access_token: str
@@ -54,11 +70,37 @@ class ProjectResponse(ProjectBase):
     id: int
     owner_id: int
     is_active: bool
+    version: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
 
+class ProjectMemberUpdate(BaseModel):
+    role: ProjectRole = ProjectRole.VIEWER
+
+class ProjectMemberResponse(BaseModel):
+    project_id: int
+    user_id: int
+    role: ProjectRole
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ActivityResponse(BaseModel):
+    id: int
+    project_id: int
+    task_id: Optional[int] = None
+    user_id: int
+    action: str
+    changes: Optional[dict] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class ActivityPage(BaseModel):
+    items: List[ActivityResponse] # newest first
+    next_cursor: Optional[str] = None # pass as ?cursor= for the next (older) page
 
 # Task schemas
 class TaskBase(BaseModel):
@@ -80,12 +122,100 @@ class TaskUpdate(BaseModel):
     assigned_to: Optional[int] = None
     due_date: Optional[datetime] = None
 
+class TaskBatchUpdateItem(TaskUpdate):
+    id: int
+    version: Optional[int] = None # like If-Match: only update from this version
+
+class TaskBatchUpdate(BaseModel):
+    updates: List[TaskBatchUpdateItem]
+
 class TaskResponse(TaskBase):
     id: int
     project_id: int
     assigned_to: Optional[int] = None
     created_by: int
+    version: int
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+class ProjectBatchResponse(BaseModel):
+    items: List[ProjectResponse] # in the order the ids were requested
+    missing: List[int]
+    forbidden: List[int]
+
+class TaskCounters(BaseModel):
+    total_tasks: int
+    todo: int
+    in_progress: int
+    done: int
+    high_priority: int
+    medium_priority: int
+    low_priority: int
+    unassigned: int
+    overdue: int
+
+class ProjectStats(TaskCounters):
+    project_id: int
+    name: str
+
+class OwnerStatsResponse(BaseModel):
+    projects: List[ProjectStats]
+    totals: TaskCounters
+    refreshed_at: Optional[datetime] = None # set when served from the materialized view
+
+class TaskBatchResponse(BaseModel):
+    items: List[TaskResponse] # in the order the ids were requested
+    missing: List[int]
+    forbidden: List[int]
+
+class TaskBatchUpdateResponse(BaseModel):
+    items: List[TaskResponse] # updated tasks, in request order
+    missing: List[int]
+    forbidden: List[int]
+    conflicts: List[int] # version no longer matched
+
+# Task with optionally expanded relationships (?expand=project,assignee,creator)
+class TaskExpandedResponse(TaskResponse):
+    project: Optional[ProjectResponse] = None
+    assignee: Optional[UserResponse] = None
+    creator: Optional[UserResponse] = None
+
+    @model_validator(mode='before')
+    @classmethod
+    def only_loaded_relationships(cls, data):
+        # Relationships are lazy='raise'; read columns plus whatever was eagerly
+        # loaded, so serializing never triggers a query. Routes use
+        # response_model_exclude_unset to leave unexpanded keys out entirely.
+        state = inspect(data, raiseerr=False)
+        if state is None:
+            return data
+        values = {key: getattr(data, key) for key in state.mapper.column_attrs.keys()}
+        for key in state.mapper.relationships.keys():
+            if key not in state.unloaded:
+                values[key] = getattr(data, key)
+        return values
+
+# Delta sync schemas
+class TombstoneResponse(BaseModel):
+    task_id: Optional[int] = None # None when the whole project was deleted
+    project_id: int
+    deleted_at: datetime
+
+class SyncResponse(BaseModel):
+    tasks: List[TaskResponse]
+    deleted: List[TombstoneResponse]
+    next_token: str
+    has_more: bool
+
+# Sparse fieldsets (?fields=id,title)
+@lru_cache(maxsize=256)
+def sparse_list_adapter(schema, fields: tuple):
+    """Adapter for a list of `schema` restricted to `fields`, built once per field set"""
+    partial = create_model(
+        f'{schema.__name__}Sparse',
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (schema.model_fields[name].annotation, schema.model_fields[name]) for name in fields}
+    )
+    return TypeAdapter(List[partial])
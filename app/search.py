@@ -0,0 +1,56 @@
+"""User search (assignee pickers), with a hot-result cache.
+
+Pickers search as the user types, so the same few prefixes ("a", "al",
+"ali") arrive from many clients at once. Results are cached per worker for
+`ttl` seconds in a small LRU; a new user shows up in the results of
+other workers within that time.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from app import crud
+
+class ResultCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires at, results)
+        self._lock = threading.Lock()
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        results = load()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, results)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+cache = ResultCache()
+
+def search_users(db: Session, q: str, limit: int) -> list:
+    """[{id, username, email}] best match first, see crud.search_users"""
+    def load():
+        return [
+            {'id': row.id, 'username': row.username, 'email': row.email}
+            for row in crud.search_users(db, q, limit)
+        ]
+    return cache.get((q.strip().lower(), limit), load)
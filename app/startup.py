@@ -0,0 +1,70 @@
+"""Startup warm-up, run by the lifespan before the app reports ready.
+
+Without it the first requests after a deploy pay for opening pool
+connections, mapper configuration and SQL compilation of the hot queries,
+loading the bcrypt backend, and building the OpenAPI schema.
+"""
+import logging
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from app import crud, database
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+def warm_pool(connections: int):
+    """Open `connections` pool connections per engine at once so they stay pooled"""
+    opened = []
+    try:
+        for engine in database.get_engines():
+            for _ in range(connections):
+                connection = engine.connect()
+                opened.append(connection)
+                connection.exec_driver_sql('SELECT 1')
+    finally:
+        for connection in opened:
+            connection.close()
+
+def warm_queries():
+    """Configure the mappers and compile the per-request lookups into the statement cache"""
+    configure_mappers()
+    db = database.SessionLocal()
+    try:
+        crud.get_user_by_email(db, email='')
+        crud.get_project(db, 0)
+        crud.get_project_owner_id(db, 0)
+        crud.get_accessible_projects(db, 0)
+        crud.get_task(db, 0)
+    finally:
+        db.close()
+
+def warm_password_hashing():
+    crud.hash_password('warm-up')
+
+# The app only reports ready once these have succeeded; the other steps just save latency
+REQUIRED_STEPS = ('pool', 'queries')
+RETRY_SECONDS = 5
+
+def warm_up(app, settings: Settings) -> bool:
+    """Run each warm-up step and log their timings; returns whether the required
+    steps succeeded. Failures are logged, not raised"""
+    steps = {
+        'pool': lambda: warm_pool(settings.warm_connections),
+        'queries': warm_queries,
+        'bcrypt': warm_password_hashing,
+        'openapi': app.openapi,
+    }
+    timings = {}
+    failed = set()
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+            failed.add(name)
+        timings[name] = time.perf_counter() - started
+    logger.info('Warm-up done: %s', ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in timings.items()))
+    return not failed.intersection(REQUIRED_STEPS)
@@ -0,0 +1,85 @@
+"""Benchmark import time and first-request latency, with and without warm-up.
+
+Every run is a fresh interpreter. It imports app.main, optionally runs the
+lifespan warm-up, then times two logins. The first login pays whatever
+startup left undone: pool connect, SQL compilation, bcrypt backend load.
+
+    DATABASE_URL=postgresql://... python benchmarks/startup.py --runs 5
+
+A benchmark user is created in the configured database if it is missing.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL = 'startup-bench@example.com'
+PASSWORD = 'startup-bench-password'
+
+
+def child(mode):
+    started = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from app.main import app
+    result = {'import': time.perf_counter() - started}
+
+    def login():
+        started = time.perf_counter()
+        response = client.post('/auth/login', data={'username': EMAIL, 'password': PASSWORD})
+        assert response.status_code == 200, response.text
+        return time.perf_counter() - started
+
+    client = TestClient(app)
+    if mode == 'warm':
+        started = time.perf_counter()
+        client.__enter__()  # runs the lifespan
+        result['warm_up'] = time.perf_counter() - started
+    result['first_request'] = login()
+    result['second_request'] = login()
+    if mode == 'warm':
+        client.__exit__(None, None, None)
+    print(json.dumps(result))
+
+
+def ensure_user():
+    sys.path.insert(0, ROOT)
+    from app import crud, schemas
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if crud.get_user_by_email(db, EMAIL) is None:
+            crud.create_user(db, schemas.UserCreate(email=EMAIL, username='startup-bench', password=PASSWORD))
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', choices=['cold', 'warm'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    ensure_user()
+    env = {**os.environ, 'RATE_LIMIT_ENABLED': 'false', 'PYTHONPATH': ROOT}
+    print(f'{"mode":<8}{"metric":<18}{"median ms":>12}{"max ms":>12}')
+    for mode in ('cold', 'warm'):
+        runs = [
+            json.loads(subprocess.run(
+                [sys.executable, __file__, '--child', mode],
+                env=env, cwd=ROOT, check=True, capture_output=True, text=True
+            ).stdout.splitlines()[-1])
+            for _ in range(args.runs)
+        ]
+        for metric in runs[0]:
+            values = [run[metric] * 1000 for run in runs]
+            print(f'{mode:<8}{metric:<18}{statistics.median(values):>12.2f}{max(values):>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
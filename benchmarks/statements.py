@@ -0,0 +1,95 @@
+"""Benchmark per-call overhead of the hot crud lookups: legacy Query chains vs prebuilt statements.
+
+Each lookup is timed as the old db.query(...).filter(...).first() and as the
+current crud function, against a scratch SQLite database (or DATABASE_URL)
+holding one user, project and task. The rows are tiny and cached by the
+database, so the difference is SQLAlchemy's statement construction and
+cache-key work per call.
+
+    python benchmarks/statements.py --calls 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{tempfile.gettempdir()}/statements-bench.db')
+
+from app import crud, models  # noqa: E402
+from app.database import Base, SessionLocal, get_engines  # noqa: E402
+
+
+def legacy_get_user_by_email(db, email):
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def legacy_get_project(db, project_id):
+    return db.query(models.Project).filter(
+        models.Project.id == project_id,
+        models.Project.deleted_at.is_(None)
+    ).first()
+
+def legacy_get_project_owner(db, project_id):
+    project = legacy_get_project(db, project_id)
+    return project.owner_id if project else None
+
+def legacy_get_task(db, task_id):
+    return db.query(models.Task).filter(models.Task.id == task_id).first()
+
+
+def seed(db):
+    user = crud.get_user_by_email(db, 'statements-bench@example.com')
+    if user is None:
+        user = models.User(email='statements-bench@example.com', username='statements-bench', hashed_password='x')
+        db.add(user)
+        db.flush()
+    project = models.Project(name='bench', owner_id=user.id)
+    db.add(project)
+    db.flush()
+    task = models.Task(title='bench', project_id=project.id, created_by=user.id)
+    db.add(task)
+    db.commit()
+    return user.email, project.id, task.id
+
+
+def time_calls(db, fn, arg, calls):
+    fn(db, arg)
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn(db, arg)
+        # Like a request: nothing stays in the identity map between calls
+        db.expunge_all()
+    return (time.perf_counter() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=get_engines()[0])
+    db = SessionLocal()
+    try:
+        email, project_id, task_id = seed(db)
+        cases = [
+            ('get_user_by_email', legacy_get_user_by_email, crud.get_user_by_email, email),
+            ('get_project', legacy_get_project, crud.get_project, project_id),
+            ('get_project_owner_id', legacy_get_project_owner, crud.get_project_owner_id, project_id),
+            ('get_task', legacy_get_task, crud.get_task, task_id),
+        ]
+        print(f'{"lookup":<22}{"legacy us":>12}{"current us":>12}{"speedup":>10}')
+        for name, legacy, current, arg in cases:
+            before = statistics.median(time_calls(db, legacy, arg, args.calls) for _ in range(args.rounds))
+            after = statistics.median(time_calls(db, current, arg, args.calls) for _ in range(args.rounds))
+            print(f'{name:<22}{before * 1e6:>12.1f}{after * 1e6:>12.1f}{before / after:>9.2f}x')
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
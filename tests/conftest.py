@@ -1,5 +1,9 @@
+import os
 import sys
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# The API's own rate limits are exercised in test_ratelimit.py
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+from app.activity import ActivityWriter
+from app.main import create_app
+
+def test_activity_is_logged_and_paginated():
+    """
+    Test changes are written by the activity writer and read back newest first, a page at a time
+    """
+    with TestClient(create_app()) as client:
+        client.post('/users/', json={'email': 'activity@email.com', 'username': 'activityuser', 'password': 'activitypass'})
+        token = client.post('/auth/login', data={'username': 'activity@email.com', 'password': 'activitypass'}).json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+        project_id = client.post('/projects/', json={'name': 'Activity'}, headers=headers).json()['id']
+        task_id = client.post('/tasks/', json={'title': 'Logged', 'project_id': project_id}, headers=headers).json()['id']
+        client.put(f'/tasks/{task_id}', json={'status': 'in_progress'}, headers=headers)
+        client.delete(f'/tasks/{task_id}', headers=headers)
+    # Leaving the client ran the lifespan shutdown, which drains the writer
+
+    with TestClient(create_app()) as client:
+        first = client.get(f'/projects/{project_id}/activity?limit=2', headers=headers).json()
+        assert [entry['action'] for entry in first['items']] == ['task.deleted', 'task.updated']
+        assert first['items'][1]['changes'] == {'status': 'in_progress'}
+
+        second = client.get(f'/projects/{project_id}/activity?limit=2&cursor={first["next_cursor"]}', headers=headers).json()
+        assert [entry['action'] for entry in second['items']] == ['task.created', 'project.created']
+        assert second['next_cursor'] is None
+
+def test_full_queue_drops_entries():
+    """
+    Test a full queue drops new entries instead of blocking
+    """
+    writer = ActivityWriter(queue_size=2)
+    for _ in range(3):
+        writer.record({'project_id': 1})
+
+    assert writer.metrics()['backlog'] == 2
+    assert writer.metrics()['dropped'] == 1
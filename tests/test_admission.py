@@ -0,0 +1,79 @@
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI, Request
+import pytest
+from app.admission import RESERVED_CONNECTIONS, AdmissionMiddleware, RouteClass, route_class, route_classes
+
+def admitted_app(queue_timeout: float):
+    app = FastAPI()
+    app.add_middleware(
+        AdmissionMiddleware,
+        classes={'read': RouteClass(1, 2), 'stats': RouteClass(1, 30)},
+        queue_timeout=queue_timeout
+    )
+
+    @app.get('/slow')
+    async def slow(request: Request):
+        await asyncio.sleep(0.2)
+        return {'remaining': request.state.deadline - time.monotonic()}
+
+    @app.get('/projects/stats')
+    async def stats():
+        return {}
+
+    return app
+
+async def fetch_concurrently(app, *paths):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        return await asyncio.gather(*(client.get(path) for path in paths))
+
+def test_route_classes():
+    """
+    Test requests are sorted into route classes
+    """
+    assert route_class('GET', '/tasks/12') == 'read'
+    assert route_class('PUT', '/tasks/12') == 'write'
+    assert route_class('POST', '/auth/login') == 'auth'
+    assert route_class('GET', '/tasks/project/3/export') == 'export'
+    assert route_class('GET', '/tasks/project/3/stats') == 'stats'
+    assert route_class('POST', '/users/bulk') == 'bulk'
+    assert route_class('GET', '/projects/3/events') is None
+    assert route_class('GET', '/health/ready') is None
+
+def test_caps_fit_the_pool():
+    """
+    Test the route class caps are carved out of the connection pool
+    """
+    for connections in (10, 15, 40):
+        classes = route_classes(connections)
+        assert sum(limit.max_in_flight for limit in classes.values()) <= connections - RESERVED_CONNECTIONS
+        assert min(limit.max_in_flight for limit in classes.values()) >= 1
+
+    classes = route_classes(30, {'stats': RouteClass(4, 15)})
+    assert classes['stats'] == RouteClass(4, 15)
+    assert sum(limit.max_in_flight for limit in classes.values()) <= 30 - RESERVED_CONNECTIONS
+
+    with pytest.raises(ValueError):
+        route_classes(15, {'read': RouteClass(24, 5)})
+
+def test_over_capacity_is_rejected_fast():
+    """
+    Test a request that cannot get a slot within the queue budget gets 503,
+    while other route classes are unaffected
+    """
+    first, second, other = asyncio.run(fetch_concurrently(admitted_app(0.05), '/slow', '/slow', '/projects/stats'))
+
+    assert first.status_code == 200
+    assert 0 < first.json()['remaining'] < 2
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == '1'
+    assert other.status_code == 200
+
+def test_waiting_request_gets_the_freed_slot():
+    """
+    Test a queued request is admitted once a slot frees up within the budget
+    """
+    responses = asyncio.run(fetch_concurrently(admitted_app(0.5), '/slow', '/slow'))
+    assert [response.status_code for response in responses] == [200, 200]
@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from app.main import app
+from app import crud
 import random
 
 client = TestClient(app)
@@ -53,6 +54,19 @@ def test_create_duplicate_user():
     assert response.status_code == 400
     assert 'already registered' in response.json()['detail']
 
+    # Duplicate username
+    response = client.post(
+        '/users/',
+        json={
+            'email': 'duplicate2@email.com',
+            'username': 'duplicateuser',
+            'password': 'duplicatepass2'
+        }
+    )
+
+    assert response.status_code == 400
+    assert response.json()['detail'] == 'Username already taken'
+
 def test_login():
     """Test user login"""
 
@@ -93,3 +107,32 @@ def test_login_invalid_credentials():
     )
 
     assert response.status_code == 401
+
+def test_search_users():
+    """
+    Test user search ranks prefix matches first and treats wildcards literally
+    """
+    for username in ('searchzed', 'searchzara', 'findsearchz', 'search_z'):
+        client.post(
+            '/users/',
+            json={'email': f'{username}@email.com', 'username': username, 'password': 'searchpass'}
+        )
+    token = client.post(
+        '/auth/login',
+        data={'username': 'searchzed@email.com', 'password': 'searchpass'}
+    ).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    # Prefix matches come first, alphabetically; the rest depends on the
+    # database (substring matches here, pg_trgm similarity on PostgreSQL)
+    response = client.get('/users/search?q=SearchZ', headers=headers)
+    assert response.status_code == 200
+    usernames = [user['username'] for user in response.json()]
+    assert usernames[:2] == ['searchzara', 'searchzed']
+    assert 'findsearchz' in usernames[2:]
+
+    # '_' is not a wildcard
+    response = client.get('/users/search?q=search_', headers=headers)
+    assert response.json()[0]['username'] == 'search_z'
+    assert crud.escape_like('a_b%c/') == 'a/_b/%c//'
+    assert client.get('/users/search?q=%20', headers=headers).status_code == 400
@@ -0,0 +1,112 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.coalescer import WriteCoalescer
+
+client = TestClient(app)
+
+def get_auth_and_project():
+    """
+    Helper function to get auth token and create a project
+    """
+    client.post(
+        '/users/',
+        json={
+            'email': 'coalescetest@email.com',
+            'username': 'coalescetestuser',
+            'password': 'coalescetestpass'
+        }
+    )
+
+    response = client.post(
+        '/auth/login',
+        data={
+            'username': 'coalescetest@email.com',
+            'password': 'coalescetestpass'
+        }
+    )
+    token = response.json()['access_token']
+
+    project_response = client.post(
+        '/projects/',
+        json={'name': 'Coalesce Test Project'},
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    return token, project_response.json()['id']
+
+def test_batch_move():
+    """
+    Test moving several tasks in one PATCH
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+    ids = [
+        client.post('/tasks/', json={'title': f'Card {i}', 'project_id': project_id}, headers=headers).json()['id']
+        for i in range(3)
+    ]
+
+    response = client.patch('/tasks/batch', json={'updates': [
+        {'id': ids[0], 'status': 'in_progress'},
+        {'id': ids[1], 'status': 'in_progress', 'version': 1},
+        {'id': ids[2], 'status': 'done', 'version': 7},
+        {'id': 999999, 'status': 'done'},
+    ]}, headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [task['id'] for task in data['items']] == ids[:2]
+    assert all(task['status'] == 'in_progress' and task['version'] == 2 for task in data['items'])
+    assert data['conflicts'] == [ids[2]]
+    assert data['missing'] == [999999]
+
+def test_coalescer_merges_updates():
+    """
+    Test rapid updates to one task become a single UPDATE and commit
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+    task = client.post('/tasks/', json={'title': 'Dragged', 'project_id': project_id}, headers=headers).json()
+    owner_id = client.get(f'/projects/{project_id}', headers=headers).json()['owner_id']
+
+    coalescer = WriteCoalescer(window=0.2).start()
+    try:
+        first = coalescer.submit(task['id'], owner_id, {'status': 'in_progress'})
+        second = coalescer.submit(task['id'], owner_id, {'status': 'done', 'priority': 'high'})
+        results = first.result(5), second.result(5)
+    finally:
+        coalescer.stop()
+
+    assert coalescer.commits == 1
+    assert coalescer.writes == 2
+    assert all(result.version == task['version'] + 1 for result in results)
+    assert results[0].status == 'done'
+    assert results[0].priority == 'high'
+
+def test_coalescer_isolates_failed_write(monkeypatch):
+    """
+    Test one failing write does not fail the other writes of its batch
+    """
+    from app import crud
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+    good, bad = (
+        client.post('/tasks/', json={'title': title, 'project_id': project_id}, headers=headers).json()['id']
+        for title in ('Good', 'Bad')
+    )
+    owner_id = client.get(f'/projects/{project_id}', headers=headers).json()['owner_id']
+
+    apply_task_update = crud.apply_task_update
+    def failing_update(db, task_id, values, project_ids, version=None):
+        if task_id == bad:
+            raise ValueError('invalid assignee')
+        return apply_task_update(db, task_id, values, project_ids, version)
+    monkeypatch.setattr(crud, 'apply_task_update', failing_update)
+
+    coalescer = WriteCoalescer(window=0.2).start()
+    try:
+        good_write = coalescer.submit(good, owner_id, {'status': 'done'})
+        bad_write = coalescer.submit(bad, owner_id, {'status': 'done'})
+        assert good_write.result(5).status == 'done'
+        assert isinstance(bad_write.exception(5), ValueError)
+    finally:
+        coalescer.stop()
@@ -0,0 +1,88 @@
+import gzip
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app.compression import CompressionMiddleware, negotiate
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+@app.get('/large')
+def large():
+    return {'items': ['task'] * 500}
+
+@app.get('/versioned/{name}')
+def versioned(name: str, response: Response):
+    # Version ETags repeat across resources
+    response.headers['ETag'] = '"1"'
+    return {'name': name, 'items': ['task'] * 500}
+
+@app.get('/small')
+def small():
+    return {'ok': True}
+
+@app.get('/stream')
+def stream():
+    return StreamingResponse((f'row {i}\n' * 100 for i in range(5)), media_type='text/csv')
+
+client = TestClient(app)
+
+def test_large_response_is_compressed():
+    """
+    Test a body over the threshold is gzipped and decodes to the same JSON
+    """
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['vary']
+    assert response.json() == {'items': ['task'] * 500}
+
+def test_small_or_unaccepted_response_is_not_compressed():
+    """
+    Test small bodies and clients without gzip get the plain body
+    """
+    assert 'content-encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'content-encoding' not in client.get('/large', headers={'Accept-Encoding': 'identity'}).headers
+
+def test_etag_not_modified():
+    """
+    Test a matching If-None-Match gets 304 and a changed one the full body
+    """
+    etag = client.get('/large', headers={'Accept-Encoding': 'gzip'}).headers['etag']
+
+    response = client.get('/large', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+
+    response = client.get('/large', headers={'If-None-Match': 'W/"stale"'})
+    assert response.status_code == 200
+
+def test_same_app_etag_different_bodies():
+    """
+    Test the compressed-body cache is not keyed on the ETag the app sets
+    """
+    for name in ('first', 'second'):
+        response = client.get(f'/versioned/{name}', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['content-encoding'] == 'gzip'
+        assert response.headers['etag'] == '"1"'
+        assert response.json()['name'] == name
+
+def test_streaming_response_is_compressed():
+    """
+    Test streamed chunks are compressed as one gzip stream
+    """
+    with client.stream('GET', '/stream', headers={'Accept-Encoding': 'gzip'}) as response:
+        raw = b''.join(response.iter_raw())
+
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-length' not in response.headers
+    assert gzip.decompress(raw).decode() == ''.join(f'row {i}\n' * 100 for i in range(5))
+
+def test_negotiate():
+    """
+    Test Accept-Encoding q-values are honoured
+    """
+    assert negotiate('gzip, deflate') == 'gzip'
+    assert negotiate('gzip;q=0') is None
+    assert negotiate('*') is not None
+    assert negotiate('') is None
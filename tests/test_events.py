@@ -0,0 +1,154 @@
+import asyncio
+import json
+import socket
+import time
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from app.main import app
+from app import events
+
+client = TestClient(app)
+
+def get_auth_and_project():
+    """
+    Helper function to get auth token and create a project
+    """
+    client.post(
+        '/users/',
+        json={
+            'email': 'eventtest@email.com',
+            'username': 'eventtestuser',
+            'password': 'eventtestpass'
+        }
+    )
+
+    response = client.post(
+        '/auth/login',
+        data={
+            'username': 'eventtest@email.com',
+            'password': 'eventtestpass'
+        }
+    )
+    token = response.json()['access_token']
+
+    project_response = client.post(
+        '/projects/',
+        json={'name': 'Event Test Project'},
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    return token, project_response.json()['id']
+
+def test_task_changes_are_published():
+    """
+    Test task mutations reach subscribers of the project
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    async def scenario():
+        # On PostgreSQL events arrive through LISTEN; outside the lifespan nothing else starts it
+        await asyncio.to_thread(events.start_listener, 5)
+        subscription = events.broker.subscribe(project_id)
+        try:
+            response = await asyncio.to_thread(
+                client.post, '/tasks/', json={'title': 'Live Task', 'project_id': project_id}, headers=headers
+            )
+            task_id = response.json()['id']
+            await asyncio.to_thread(client.put, f'/tasks/{task_id}', json={'status': 'done'}, headers=headers)
+
+            created = await asyncio.wait_for(subscription.queue.get(), 5)
+            updated = await asyncio.wait_for(subscription.queue.get(), 5)
+            return task_id, created, updated
+        finally:
+            events.broker.unsubscribe(subscription)
+            events.stop_listener()
+
+    task_id, created, updated = asyncio.run(scenario())
+    assert created == {'type': 'task.created', 'project_id': project_id, 'task_id': task_id}
+    assert updated['type'] == 'task.updated'
+
+def test_slow_subscriber_gets_resync():
+    """
+    Test a subscriber whose queue overflows is told to resync
+    """
+    async def scenario():
+        subscription = events.broker.subscribe(-1)
+        try:
+            for task_id in range(events.QUEUE_SIZE + 1):
+                subscription.offer({'type': 'task.updated', 'project_id': -1, 'task_id': task_id})
+            return [event async for event in subscription.stream(heartbeat=1)]
+        finally:
+            events.broker.unsubscribe(subscription)
+
+    assert asyncio.run(scenario()) == [events.RESYNC]
+
+def test_project_events_unauthorized():
+    """
+    Test the event stream requires authentication
+    """
+    response = client.get('/projects/1/events')
+
+    assert response.status_code == 401
+
+class FakeListenConnection:
+    """
+    Stands in for a psycopg2 connection: delivers `payloads` on the first poll,
+    then fails on the next one if `fails`, like a database restart
+    """
+    def __init__(self, payloads, fails):
+        self.reader, self.writer = socket.socketpair()
+        self.writer.send(b'!')
+        self.payloads = payloads
+        self.fails = fails
+        self.notifies = []
+        self.autocommit = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def cursor(self):
+        return SimpleNamespace(execute=lambda sql: None)
+
+    def poll(self):
+        if self.payloads is None:
+            raise ConnectionError('server closed the connection')
+        self.notifies.extend(SimpleNamespace(payload=payload) for payload in self.payloads)
+        self.payloads = None if self.fails else []
+        if not self.fails:
+            self.reader.recv(1)
+
+def test_listener_reconnects(monkeypatch):
+    """
+    Test the listener survives a failed connect, bad payloads, failing handlers
+    and a lost connection, and announces every LISTEN
+    """
+    monkeypatch.setattr(events, 'RECONNECT_MIN_SECONDS', 0.01)
+    connections = iter([
+        None,  # database down
+        FakeListenConnection(['not json', json.dumps({'type': 'access.changed', 'user_ids': [1]})], fails=True),
+        FakeListenConnection([], fails=False),
+    ])
+    def raw_connection():
+        connection = next(connections)
+        if connection is None:
+            raise ConnectionError('connection refused')
+        return SimpleNamespace(driver_connection=connection, detach=lambda: None, close=lambda: None)
+
+    broker = events.EventBroker()
+    received = []
+    broker.add_handler('access.changed', lambda event: 1 / 0)
+    broker.add_handler('access.changed', received.append)
+    broker.add_handler(events.LISTENING, received.append)
+    listener = events.PostgresListener(broker, SimpleNamespace(raw_connection=raw_connection), poll_seconds=0.05)
+    listener.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(received) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [event['type'] for event in received] == [events.LISTENING, 'access.changed', events.LISTENING]
+        assert listener.listening.wait(1)
+        assert listener.is_alive()
+    finally:
+        listener.stop()
+        listener.join(1)
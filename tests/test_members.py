@@ -0,0 +1,58 @@
+import random
+from fastapi.testclient import TestClient
+from app.access import AccessCache
+from app.main import app
+
+client = TestClient(app)
+
+def login(email, username):
+    """
+    Helper function to register a new user and get an auth header and user id
+    """
+    suffix = random.randint(100000, 999999)
+    email, username = f'{suffix}{email}', f'{username}{suffix}'
+    user = client.post('/users/', json={'email': email, 'username': username, 'password': 'memberpass'}).json()
+    token = client.post('/auth/login', data={'username': email, 'password': 'memberpass'}).json()['access_token']
+    return {'Authorization': f'Bearer {token}'}, user['id']
+
+def test_shared_project_roles():
+    """
+    Test viewers can read, editors can also write tasks, and unsharing takes effect at once
+    """
+    owner, _ = login('memberowner@email.com', 'memberowner')
+    member, member_id = login('member@email.com', 'member')
+    project_id = client.post('/projects/', json={'name': 'Shared'}, headers=owner).json()['id']
+    task_id = client.post('/tasks/', json={'title': 'Shared task', 'project_id': project_id}, headers=owner).json()['id']
+
+    assert client.get(f'/projects/{project_id}', headers=member).status_code == 403
+
+    response = client.put(f'/projects/{project_id}/members/{member_id}', json={'role': 'viewer'}, headers=owner)
+    assert response.status_code == 200
+    assert response.json()['role'] == 'viewer'
+    assert project_id in [p['id'] for p in client.get('/projects/', headers=member).json()]
+    assert client.get(f'/tasks/{task_id}', headers=member).status_code == 200
+    assert client.put(f'/tasks/{task_id}', json={'status': 'done'}, headers=member).status_code == 403
+    assert client.post('/tasks/', json={'title': 'No', 'project_id': project_id}, headers=member).status_code == 403
+    assert client.put(f'/projects/{project_id}/members/{member_id}', json={'role': 'editor'}, headers=member).status_code == 403
+
+    client.put(f'/projects/{project_id}/members/{member_id}', json={'role': 'editor'}, headers=owner)
+    assert client.put(f'/tasks/{task_id}', json={'status': 'done'}, headers=member).json()['status'] == 'done'
+    assert [m['user_id'] for m in client.get(f'/projects/{project_id}/members', headers=member).json()] == [member_id]
+
+    assert client.delete(f'/projects/{project_id}/members/{member_id}', headers=owner).status_code == 204
+    assert client.get(f'/tasks/{task_id}', headers=member).status_code == 403
+    assert project_id not in [p['id'] for p in client.get('/projects/', headers=member).json()]
+
+def test_cache_skips_loads_overlapping_invalidation():
+    """
+    Test an access set loaded while it was being invalidated is not cached
+    """
+    cache = AccessCache()
+
+    def stale_load():
+        cache.forget([1])
+        return {10: 'owner'}
+
+    assert cache.get(1, stale_load) == {10: 'owner'}
+    assert cache.get(1, lambda: {}) == {}
+    assert cache.get(1, lambda: {20: 'viewer'}) == {}
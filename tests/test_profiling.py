@@ -0,0 +1,48 @@
+import dataclasses
+from fastapi.testclient import TestClient
+from app import database, profiling
+from app.config import get_settings, use_settings
+from app.main import create_app
+
+def login(client, email, username):
+    """
+    Helper function to register a user and get an auth header
+    """
+    client.post('/users/', json={'email': email, 'username': username, 'password': 'profilepass'})
+    response = client.post('/auth/login', data={'username': email, 'password': 'profilepass'})
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+def test_profiling_is_admin_only():
+    """
+    Test sampling and X-Profile work for admins and are ignored for others
+    """
+    original = get_settings()
+    settings = dataclasses.replace(original, admin_emails=('profileadmin@email.com',), profile_requests=True)
+    try:
+        client = TestClient(create_app(settings))
+        admin = login(client, 'profileadmin@email.com', 'profileadmin')
+        user = login(client, 'profileuser@email.com', 'profileuser')
+
+        assert client.get('/admin/profile?seconds=0.1', headers=user).status_code == 403
+        response = client.get('/admin/profile?seconds=0.2', headers=admin)
+        assert response.status_code == 200
+        stack, count = response.text.splitlines()[0].rsplit(' ', 1)
+        assert ';' in stack and int(count) > 0
+
+        response = client.get('/projects/', headers={**admin, 'X-Profile': 'cumulative'})
+        assert response.headers['X-Profile-Status'] == '200'
+        assert 'function calls' in response.text
+        # The endpoint ran in the threadpool; its own profile is merged in
+        assert 'crud.py' in response.text
+
+        response = client.get('/projects/', headers={**user, 'X-Profile': 'tottime'})
+        assert response.json() == []
+
+        # Only one request is profiled at a time
+        with profiling._profiling:
+            response = client.get('/projects/', headers={**admin, 'X-Profile': 'cumulative'})
+        assert response.status_code == 409
+        assert client.get('/projects/', headers={**admin, 'X-Profile': 'cumulative'}).headers['X-Profile-Status'] == '200'
+    finally:
+        use_settings(original)
+        database.configure(original)
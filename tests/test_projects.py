@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
 from app.main import app
+import random
 
 client = TestClient(app)
 
@@ -83,3 +84,125 @@ def test_get_project_unauthorized():
     response = client.get('/projects/')
     
     assert response.status_code == 401
+
+def test_delete_project_with_tasks():
+    """
+    Test deleting a project hides it and removes its tasks
+    """
+    token = get_auth_token()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    project_id = client.post(
+        '/projects/',
+        json={'name': 'Doomed Project'},
+        headers=headers
+    ).json()['id']
+    task_id = client.post(
+        '/tasks/',
+        json={'title': 'Doomed Task', 'project_id': project_id},
+        headers=headers
+    ).json()['id']
+
+    response = client.delete(f'/projects/{project_id}', headers=headers)
+    assert response.status_code == 204
+
+    assert client.get(f'/projects/{project_id}', headers=headers).status_code == 404
+    assert client.get(f'/tasks/{task_id}', headers=headers).status_code == 404
+    projects = client.get('/projects/', headers=headers).json()
+    assert project_id not in [p['id'] for p in projects]
+
+def test_get_projects_by_ids_forbidden():
+    """
+    Test batch fetching reports projects owned by someone else
+    """
+    token = get_auth_token()
+    own_id = client.post(
+        '/projects/',
+        json={'name': 'Batch Project'},
+        headers={'Authorization': f'Bearer {token}'}
+    ).json()['id']
+
+    client.post(
+        '/users/',
+        json={'email': 'otherowner@email.com', 'username': 'otherowner', 'password': 'otherownerpass'}
+    )
+    other_token = client.post(
+        '/auth/login',
+        data={'username': 'otherowner@email.com', 'password': 'otherownerpass'}
+    ).json()['access_token']
+    other_id = client.post(
+        '/projects/',
+        json={'name': 'Not Yours'},
+        headers={'Authorization': f'Bearer {other_token}'}
+    ).json()['id']
+
+    response = client.get(
+        f'/projects/batch?ids={own_id},{other_id}',
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [p['id'] for p in data['items']] == [own_id]
+    assert data['forbidden'] == [other_id]
+
+def test_owner_stats():
+    """
+    Test owner-wide stats count every project's tasks in one call
+    """
+    # A fresh owner each run, so projects from earlier runs are not counted
+    random_num = random.randint(100000, 999999)
+    client.post(
+        '/users/',
+        json={'email': f'statstest{random_num}@email.com', 'username': f'statstestuser{random_num}', 'password': 'statstestpass'}
+    )
+    token = client.post(
+        '/auth/login',
+        data={'username': f'statstest{random_num}@email.com', 'password': 'statstestpass'}
+    ).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    first = client.post('/projects/', json={'name': 'Stats One'}, headers=headers).json()['id']
+    second = client.post('/projects/', json={'name': 'Stats Two'}, headers=headers).json()['id']
+    client.post('/tasks/', json={'title': 'A', 'priority': 'high', 'project_id': first}, headers=headers)
+    client.post('/tasks/', json={'title': 'B', 'status': 'done', 'project_id': first}, headers=headers)
+    client.post(
+        '/tasks/',
+        json={'title': 'Late', 'due_date': '2020-01-01T00:00:00Z', 'project_id': first},
+        headers=headers
+    )
+
+    response = client.get('/projects/stats', headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [project['project_id'] for project in data['projects']] == [first, second]
+    assert data['projects'][0]['total_tasks'] == 3
+    assert data['projects'][1]['total_tasks'] == 0
+    assert data['totals']['total_tasks'] == 3
+    assert data['totals']['done'] == 1
+    assert data['totals']['high_priority'] == 1
+    assert data['totals']['overdue'] == 1
+    assert data['refreshed_at'] is None
+
+def test_update_project_if_match():
+    """
+    Test a project update with a stale If-Match is rejected
+    """
+    token = get_auth_token()
+    headers = {'Authorization': f'Bearer {token}'}
+    project_id = client.post('/projects/', json={'name': 'Versioned Project'}, headers=headers).json()['id']
+
+    response = client.put(f'/projects/{project_id}', json={'name': 'Renamed'}, headers={**headers, 'If-Match': '"1"'})
+    assert response.status_code == 200
+    assert response.json()['version'] == 2
+
+    response = client.put(f'/projects/{project_id}', json={'name': 'Stale'}, headers={**headers, 'If-Match': '"1"'})
+    assert response.status_code == 412
+    assert client.get(f'/projects/{project_id}', headers=headers).json()['name'] == 'Renamed'
+
+    # Weak tags compare by version; tags that are not a version never match
+    response = client.put(f'/projects/{project_id}', json={'name': 'Weak'}, headers={**headers, 'If-Match': 'W/"2"'})
+    assert response.status_code == 200
+    response = client.put(f'/projects/{project_id}', json={'name': 'Other'}, headers={**headers, 'If-Match': '"abc123"'})
+    assert response.status_code == 412
@@ -0,0 +1,71 @@
+import dataclasses
+import random
+from fastapi.testclient import TestClient
+from app import crud, database, provisioning
+from app.config import get_settings, use_settings
+from app.main import create_app
+
+def login(client, email, username):
+    """
+    Helper function to register a user and get an auth header
+    """
+    client.post('/users/', json={'email': email, 'username': username, 'password': 'provisionpass'})
+    response = client.post('/auth/login', data={'username': email, 'password': 'provisionpass'})
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+def test_bulk_provisioning():
+    """
+    Test admins can create users from CSV, with bad and taken rows skipped
+    """
+    original = get_settings()
+    settings = dataclasses.replace(original, admin_emails=('provisionadmin@email.com',))
+    try:
+        client = TestClient(create_app(settings))
+        admin = login(client, 'provisionadmin@email.com', 'provisionadmin')
+        user = login(client, 'provisionuser@email.com', 'provisionuser')
+
+        run = random.randint(100000, 999999)
+        csv_text = (
+            'email,username,password\n'
+            f'bulk1-{run}@email.com,bulkuser1-{run},bulkpass1\n'
+            f'not-an-email,bulkuser2-{run},bulkpass2\n'
+            f'bulk3-{run}@email.com,bulkuser3-{run},bulkpass3\n'
+            f'bulk3-{run}@email.com,bulkuser4-{run},bulkpass4\n'
+            f'provisionuser@email.com,bulkuser5-{run},bulkpass5\n'
+        )
+        files = {'file': ('users.csv', csv_text, 'text/csv')}
+        assert client.post('/users/bulk', files=files, headers=user).status_code == 403
+
+        response = client.post('/users/bulk', files=files, headers=admin)
+        assert response.status_code == 200
+        result = response.json()
+        assert result['created'] == 2
+        assert [(entry['line'], entry['detail']) for entry in result['skipped'][1:]] == [
+            (5, 'Duplicate of an earlier row'),
+            (6, 'Email already registered'),
+        ]
+        assert result['skipped'][0]['line'] == 3
+        response = client.post('/auth/login', data={'username': f'bulk3-{run}@email.com', 'password': 'bulkpass3'})
+        assert response.status_code == 200
+
+        # Importing again creates nothing
+        result = client.post('/users/bulk', files=files, headers=admin).json()
+        assert result['created'] == 0
+        assert len(result['skipped']) == 5
+
+        files = {'file': ('users.csv', 'email,password\n', 'text/csv')}
+        response = client.post('/users/bulk', files=files, headers=admin)
+        assert response.status_code == 400
+        assert 'username' in response.json()['detail']
+    finally:
+        use_settings(original)
+        database.configure(original)
+
+def test_hash_passwords_in_worker_processes(monkeypatch):
+    """
+    Test passwords hashed by the process pool verify, in order
+    """
+    monkeypatch.setattr(provisioning, 'PARALLEL_MIN_PASSWORDS', 0)
+    hashes = provisioning.hash_passwords(['first', 'second'], workers=2)
+    assert crud.verify_password('first', hashes[0])
+    assert crud.verify_password('second', hashes[1])
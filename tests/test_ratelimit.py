@@ -0,0 +1,59 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import auth
+from app.ratelimit import RateLimitMiddleware, RateLimit, MemoryBackend
+
+limited_app = FastAPI()
+limited_app.add_middleware(
+    RateLimitMiddleware,
+    backend=MemoryBackend(),
+    limits={'POST /auth/login': RateLimit(2, 60), 'GET /health': None},
+    default=RateLimit(3, 60)
+)
+
+@limited_app.post('/auth/login')
+def login():
+    return {}
+
+@limited_app.get('/tasks/my-tasks')
+def my_tasks():
+    return []
+
+@limited_app.get('/health')
+def health():
+    return {}
+
+client = TestClient(limited_app)
+
+def test_route_quota_returns_429():
+    """
+    Test exceeding a route quota is rejected with rate limit headers
+    """
+    assert client.post('/auth/login').status_code == 200
+    response = client.post('/auth/login')
+    assert response.status_code == 200
+    assert response.headers['RateLimit-Limit'] == '2'
+    assert response.headers['RateLimit-Remaining'] == '0'
+
+    response = client.post('/auth/login')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+def test_buckets_are_per_user():
+    """
+    Test each token holder gets its own bucket
+    """
+    for user_id in (1, 2):
+        token = auth.create_access_token(data={'sub': f'user{user_id}@email.com', 'uid': user_id})
+        headers = {'Authorization': f'Bearer {token}'}
+        statuses = [client.get('/tasks/my-tasks', headers=headers).status_code for _ in range(4)]
+        assert statuses == [200, 200, 200, 429]
+
+def test_unlimited_route():
+    """
+    Test routes configured without a limit are never throttled
+    """
+    for _ in range(10):
+        response = client.get('/health')
+        assert response.status_code == 200
+    assert 'RateLimit-Limit' not in response.headers
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+from app.main import app
+from app.database import SessionLocal
+from app import models, reminders
+
+client = TestClient(app)
+
+def get_auth_and_project():
+    """
+    Helper function to get auth token and create a project
+    """
+    client.post(
+        '/users/',
+        json={
+            'email': 'remindertest@email.com',
+            'username': 'remindertestuser',
+            'password': 'remindertestpass'
+        }
+    )
+
+    response = client.post(
+        '/auth/login',
+        data={
+            'username': 'remindertest@email.com',
+            'password': 'remindertestpass'
+        }
+    )
+    token = response.json()['access_token']
+
+    project_response = client.post(
+        '/projects/',
+        json={'name': 'Reminder Test Project'},
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    return token, project_response.json()['id']
+
+def sent_reminders(db, task_ids):
+    """
+    Helper function to list the reminders sent for some tasks
+    """
+    return set(db.execute(
+        select(models.TaskReminder.task_id, models.TaskReminder.kind).where(models.TaskReminder.task_id.in_(task_ids))
+    ).all())
+
+def create_task(headers, project_id, title, due_date, status='todo'):
+    """
+    Helper function to create a task with a due date
+    """
+    response = client.post(
+        '/tasks/',
+        json={'title': title, 'status': status, 'due_date': due_date.isoformat(), 'project_id': project_id},
+        headers=headers
+    )
+    return response.json()['id']
+
+def test_reminders_fire_once():
+    """
+    Test upcoming and overdue reminders are sent once per open task
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+    now = datetime.now(timezone.utc)
+
+    db = SessionLocal()
+    try:
+        # Marks left by other runs would be ahead of this test's clock
+        db.execute(delete(models.ReminderMark))
+        db.commit()
+
+        overdue = create_task(headers, project_id, 'Already Overdue', now - timedelta(hours=1))
+        # First scan sets the high-water marks and catches tasks that were already due
+        reminders.run_once(db, now)
+        assert sent_reminders(db, [overdue]) == {(overdue, 'overdue')}
+
+        soon = create_task(headers, project_id, 'Soon', now + timedelta(hours=2))
+        later = create_task(headers, project_id, 'Later', now + timedelta(hours=30))
+        finished = create_task(headers, project_id, 'Finished', now + timedelta(hours=3), status='done')
+        ids = [soon, later, finished]
+
+        # 'Soon' was created inside the window that was already scanned
+        reminders.run_once(db, now + timedelta(minutes=1))
+        assert sent_reminders(db, ids) == {(soon, 'due_soon')}
+        reminders.run_once(db, now + timedelta(minutes=2))
+        assert sent_reminders(db, ids) == {(soon, 'due_soon')}
+        # 'Later' comes within 24 hours and 'Soon' is overdue
+        reminders.run_once(db, now + timedelta(hours=7))
+        assert sent_reminders(db, ids) == {(soon, 'due_soon'), (soon, 'overdue'), (later, 'due_soon')}
+        # 'Later' is overdue too
+        reminders.run_once(db, now + timedelta(hours=31))
+        assert (later, 'overdue') in sent_reminders(db, ids)
+
+        # Created with a due date the overdue mark has already passed
+        missed = create_task(headers, project_id, 'Missed', now + timedelta(hours=20))
+        reminders.run_once(db, now + timedelta(hours=32))
+        assert sent_reminders(db, [missed]) == {(missed, 'overdue')}
+        assert len(sent_reminders(db, ids)) == 4
+    finally:
+        db.execute(delete(models.ReminderMark))
+        db.commit()
+        db.close()
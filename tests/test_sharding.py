@@ -0,0 +1,78 @@
+import dataclasses
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+from app import database, models
+from app.config import get_settings, use_settings
+from app.database import Base
+from app.main import create_app
+
+def test_users_and_projects_route_by_id(tmp_path):
+    """
+    Test rows land on their owner's shard and are found again by id
+    """
+    original = get_settings()
+    sharded = dataclasses.replace(
+        original,
+        shard_urls=(f'sqlite:///{tmp_path}/shard0.db', f'sqlite:///{tmp_path}/shard1.db')
+    )
+    try:
+        client = TestClient(create_app(sharded))
+        for engine in database.engines:
+            Base.metadata.create_all(bind=engine)
+
+        users = {}
+        for n in range(6):
+            email = f'shard{n}@example.com'
+            response = client.post('/users/', json={'email': email, 'username': f'shard{n}', 'password': 'secret'})
+            assert response.status_code == 201
+            user = response.json()
+            assert user['id'] % 2 == database.shard_for_email(email)
+            users[email] = user
+        assert {user['id'] % 2 for user in users.values()} == {0, 1}
+
+        for email, user in users.items():
+            token = client.post('/auth/login', data={'username': email, 'password': 'secret'}).json()['access_token']
+            headers = {'Authorization': f'Bearer {token}'}
+
+            project = client.post('/projects/', json={'name': 'Sharded'}, headers=headers).json()
+            assert project['id'] % 2 == user['id'] % 2
+            task = client.post('/tasks/', json={'title': 'Routed', 'project_id': project['id']}, headers=headers).json()
+            assert task['id'] % 2 == user['id'] % 2
+            assert client.get(f'/tasks/{task["id"]}', headers=headers).json()['title'] == 'Routed'
+
+        # Directory-style reads gather every shard
+        listed = client.get('/users/', headers=headers).json()
+        assert [user['id'] for user in listed] == sorted(user['id'] for user in users.values())
+        other = next(u for u in users.values() if u['id'] % 2 != user['id'] % 2)
+        assert client.get(f'/users/{other["id"]}', headers=headers).json()['email'] == other['email']
+    finally:
+        use_settings(original)
+        database.configure(original)
+
+def test_pinned_session_stays_on_its_shard(tmp_path):
+    """
+    Test a pinned session only queries its shard unless asked to scatter
+    """
+    original = get_settings()
+    sharded = dataclasses.replace(
+        original,
+        shard_urls=(f'sqlite:///{tmp_path}/shard0.db', f'sqlite:///{tmp_path}/shard1.db')
+    )
+    try:
+        database.configure(sharded)
+        queried = []
+        for shard, engine in enumerate(database.engines):
+            Base.metadata.create_all(bind=engine)
+            event.listen(engine, 'before_cursor_execute', lambda *args, shard=shard: queried.append(shard))
+
+        db = database.pin_shard(database.SessionLocal(), 1)
+        try:
+            db.scalars(select(models.User)).all()
+            assert queried == [1]
+            db.scalars(select(models.User).execution_options(all_shards=True)).all()
+            assert sorted(queried) == [0, 1, 1]
+        finally:
+            db.close()
+    finally:
+        use_settings(original)
+        database.configure(original)
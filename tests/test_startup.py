@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from fastapi.testclient import TestClient
+from app.main import LazyApp, app, create_app
+
+def test_not_ready_before_startup():
+    """
+    Test readiness fails until the lifespan has run
+    """
+    response = TestClient(app).get('/health/ready')
+
+    assert response.status_code == 503
+
+def test_ready_after_warm_up():
+    """
+    Test a fresh app warms up and reports ready
+    """
+    with TestClient(create_app()) as client:
+        assert client.app.state.ready
+        assert client.get('/health/ready').json() == {'status': 'ready'}
+
+def test_not_ready_until_pool_opens(monkeypatch):
+    """
+    Test readiness stays red while the pool cannot be opened and turns green once it can
+    """
+    import time
+    from app import startup
+
+    warm_pool = startup.warm_pool
+    def database_down(connections):
+        raise ConnectionError('database down')
+    monkeypatch.setattr(startup, 'warm_pool', database_down)
+    monkeypatch.setattr(startup, 'RETRY_SECONDS', 0.05)
+
+    with TestClient(create_app()) as client:
+        assert client.get('/health/ready').status_code == 503
+        monkeypatch.setattr(startup, 'warm_pool', warm_pool)
+        deadline = time.monotonic() + 10
+        while not client.app.state.ready and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert client.get('/health/ready').json() == {'status': 'ready'}
+
+def test_import_reads_no_settings():
+    """
+    Test importing the app reads no settings and creates no engines; the
+    module-level app builds itself on its first event
+    """
+    code = 'from app import config, database, main; assert config._settings is None and not database.engines'
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.dirname(__file__)) or '.')
+
+    with TestClient(LazyApp()) as client:
+        assert client.get('/health/ready').json() == {'status': 'ready'}
@@ -0,0 +1,106 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def get_auth_and_project():
+    """
+    Helper function to get auth token and create a project
+    """
+    client.post(
+        '/users/',
+        json={
+            'email': 'synctest@email.com',
+            'username': 'synctestuser',
+            'password': 'synctestpass'
+        }
+    )
+
+    response = client.post(
+        '/auth/login',
+        data={
+            'username': 'synctest@email.com',
+            'password': 'synctestpass'
+        }
+    )
+    token = response.json()['access_token']
+
+    project_response = client.post(
+        '/projects/',
+        json={'name': 'Sync Test Project'},
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    return token, project_response.json()['id']
+
+def sync_all(headers, token=None, limit=500):
+    """
+    Follow next_token until the backlog is drained
+    """
+    tasks, deleted = [], []
+    while True:
+        params = {'limit': limit}
+        if token:
+            params['since'] = token
+        data = client.get('/sync', params=params, headers=headers).json()
+        tasks += data['tasks']
+        deleted += data['deleted']
+        token = data['next_token']
+        if not data['has_more']:
+            return tasks, deleted, token
+
+def test_sync_returns_changes_since_token():
+    """
+    Test delta sync reports new, updated and deleted tasks
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    ids = [
+        client.post('/tasks/', json={'title': f'Sync Task {i}', 'project_id': project_id}, headers=headers).json()['id']
+        for i in range(3)
+    ]
+
+    tasks, _, sync_token = sync_all(headers, limit=2)
+    assert set(ids) <= {t['id'] for t in tasks}
+
+    # Nothing changed since the last sync
+    tasks, deleted, sync_token = sync_all(headers, sync_token)
+    assert tasks == [] and deleted == []
+
+    client.put(f'/tasks/{ids[0]}', json={'status': 'done'}, headers=headers)
+    client.delete(f'/tasks/{ids[1]}', headers=headers)
+
+    tasks, deleted, sync_token = sync_all(headers, sync_token)
+    assert [(t['id'], t['status']) for t in tasks] == [(ids[0], 'done')]
+    assert [(d['task_id'], d['project_id']) for d in deleted] == [(ids[1], project_id)]
+
+def test_sync_invalid_token():
+    """
+    Test a malformed sync token is rejected
+    """
+    token, _ = get_auth_and_project()
+
+    response = client.get('/sync?since=garbage', headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 400
+
+def test_sync_tampered_token():
+    """
+    Test a token whose contents were changed is rejected, and limit is clamped
+    """
+    import base64
+    token, _ = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/sync?limit=0', headers=headers)
+    assert response.status_code == 200
+    sync_token = response.json()['next_token']
+
+    raw, _, signature = base64.urlsafe_b64decode(sync_token).decode().rpartition('.')
+    *cursor, issued_at = raw.split('.')
+    forged = '.'.join([*cursor, str(int(issued_at) + 10 ** 9)])
+    forged_token = base64.urlsafe_b64encode(f'{forged}.{signature}'.encode()).decode()
+
+    response = client.get('/sync', params={'since': forged_token}, headers=headers)
+    assert response.status_code == 400
@@ -189,3 +189,171 @@ def test_create_task_invalid_status():
     )
 
     assert response.status_code == 422
+
+def test_get_project_tasks_expanded():
+    """
+    Test expanding task relationships in a list response
+    """
+    token, project_id = get_auth_and_project()
+
+    client.post(
+        '/tasks/',
+        json={'title': 'Expanded Task', 'project_id': project_id},
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    response = client.get(
+        f'/tasks/project/{project_id}?expand=project,creator',
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) > 0
+    assert data[0]['project']['id'] == project_id
+    assert data[0]['creator']['email'] == 'tasktest@email.com'
+    assert 'assignee' not in data[0]
+
+    # Unexpanded responses leave relationships out
+    response = client.get(
+        f'/tasks/project/{project_id}',
+        headers={'Authorization': f'Bearer {token}'}
+    )
+    assert 'project' not in response.json()[0]
+
+def test_get_project_tasks_invalid_expand():
+    """
+    Test expanding an unknown relationship fails
+    """
+    token, project_id = get_auth_and_project()
+
+    response = client.get(
+        f'/tasks/project/{project_id}?expand=owner',
+        headers={'Authorization': f'Bearer {token}'}
+    )
+
+    assert response.status_code == 400
+
+def test_archived_tasks():
+    """
+    Test archived tasks are hidden by default but still counted in stats
+    """
+    from datetime import datetime, timezone
+    from sqlalchemy import update
+    from app import crud, models
+    from app.database import SessionLocal
+
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    for title, status in [('Old Done Task', 'done'), ('Open Task', 'todo')]:
+        client.post(
+            '/tasks/',
+            json={'title': title, 'status': status, 'project_id': project_id},
+            headers=headers
+        )
+
+    # Backdate this test's done task, so the cutoff leaves other tests' tasks alone
+    long_ago = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(models.Task).where(models.Task.project_id == project_id).values(updated_at=long_ago),
+            execution_options={'synchronize_session': False}
+        )
+        db.commit()
+        crud.archive_done_tasks(db, datetime(2000, 1, 2, tzinfo=timezone.utc))
+    finally:
+        db.close()
+
+    hot = client.get(f'/tasks/project/{project_id}', headers=headers).json()
+    assert [t['title'] for t in hot] == ['Open Task']
+
+    response = client.get(f'/tasks/project/{project_id}?include_archived=true', headers=headers)
+    assert response.status_code == 200
+    assert {t['title'] for t in response.json()} == {'Old Done Task', 'Open Task'}
+
+    stats = client.get(f'/tasks/project/{project_id}/stats', headers=headers).json()
+    assert stats['total_tasks'] == 2
+    assert stats['done'] == 1
+
+def test_get_tasks_by_ids():
+    """
+    Test batch fetching tasks keeps request order and reports missing ids
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    ids = [
+        client.post('/tasks/', json={'title': f'Batch Task {i}', 'project_id': project_id}, headers=headers).json()['id']
+        for i in range(3)
+    ]
+
+    response = client.get(f'/tasks/batch?ids={ids[2]},999999,{ids[0]}', headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [t['id'] for t in data['items']] == [ids[2], ids[0]]
+    assert data['missing'] == [999999]
+    assert data['forbidden'] == []
+
+def test_get_project_tasks_sparse_fields():
+    """
+    Test ?fields= limits the returned task fields
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.post(
+        '/tasks/',
+        json={'title': 'Sparse Task', 'description': 'Long text', 'project_id': project_id},
+        headers=headers
+    )
+
+    response = client.get(f'/tasks/project/{project_id}?fields=title,status', headers=headers)
+    assert response.status_code == 200
+    assert all(set(task) == {'id', 'title', 'status'} for task in response.json())
+
+    response = client.get(f'/tasks/project/{project_id}?fields=title,secret', headers=headers)
+    assert response.status_code == 400
+
+def test_export_project_tasks():
+    """
+    Test exporting a project's tasks as CSV
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    client.post('/tasks/', json={'title': 'Exported Task', 'project_id': project_id}, headers=headers)
+
+    response = client.get(f'/tasks/project/{project_id}/export', headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    lines = response.text.splitlines()
+    assert lines[0].startswith('id,title,')
+    assert any('Exported Task' in line for line in lines[1:])
+
+def test_update_task_if_match():
+    """
+    Test conditional updates with If-Match and the task version ETag
+    """
+    token, project_id = get_auth_and_project()
+    headers = {'Authorization': f'Bearer {token}'}
+
+    task_id = client.post('/tasks/', json={'title': 'Versioned', 'project_id': project_id}, headers=headers).json()['id']
+    etag = client.get(f'/tasks/{task_id}', headers=headers).headers['etag']
+    assert etag == '"1"'
+
+    response = client.put(f'/tasks/{task_id}', json={'status': 'done'}, headers={**headers, 'If-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] == '"2"'
+    assert response.json()['version'] == 2
+
+    # A second writer holding the old ETag loses
+    response = client.put(f'/tasks/{task_id}', json={'title': 'Stale'}, headers={**headers, 'If-Match': etag})
+    assert response.status_code == 412
+    assert response.headers['etag'] == '"2"'
+
+    assert client.get(f'/tasks/{task_id}', headers={**headers, 'If-None-Match': '"2"'}).status_code == 304
+    assert client.put(f'/tasks/999999', json={'title': 'Missing'}, headers=headers).status_code == 404